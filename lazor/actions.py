@@ -1,9 +1,55 @@
 from tkinter import messagebox, simpledialog
 
-from lazor.analysis import join_lines, collate_lines, \
-    optimise_line_set_ordering, ideal_laser_distance, estimated_laser_time, \
-    estimated_engrave_time
+from lazor.analysis import ideal_laser_distance, estimated_laser_time, \
+    estimated_engrave_time, laser_transitions, chain_lines, order_chains, \
+    flatten_chains, tab_lines, find_crossings, split_at_crossings, \
+    merge_colinear, simplify_lines, fit_arcs, autofix_layer, explode_layer, \
+    estimated_motion_time, MotionProfile
+from lazor.cache import default_cache
+from lazor.datastructures import Vec2, Arc
 from lazor.exceptions import AbortAction
+from lazor.tour import optimise_layers, improve_chain_ordering, budget_shares, COST_MODELS
+
+_profile = MotionProfile()
+_optimise_for = "distance"
+
+
+def ask_motion_profile():
+    """
+    Asks for the tool's speeds and acceleration, starting from the answers
+    last given, so every action estimates times for the same machine.
+    """
+
+    global _profile
+
+    idle_speed = simpledialog.askfloat("Idle Speed", "Please enter the tool idle speed", initialvalue=_profile.idle_speed)
+    active_speed = simpledialog.askfloat("Active Speed", "Please enter the tool active speed", initialvalue=_profile.active_speed)
+    acceleration = simpledialog.askfloat("Acceleration", "Please enter the tool acceleration", initialvalue=_profile.acceleration)
+    if None in (idle_speed, active_speed, acceleration):
+        raise AbortAction()
+
+    _profile = _profile._replace(idle_speed=idle_speed, active_speed=active_speed, acceleration=acceleration)
+    return _profile
+
+
+def ask_cost_model():
+    """
+    Asks which of COST_MODELS to optimise for, starting from the answer last
+    given, and only asks for the motion profile when that model uses it.
+    """
+
+    global _optimise_for
+
+    optimise_for = simpledialog.askstring("Optimisation Goal", "Please enter what to minimise: {}".format(", ".join(COST_MODELS)), initialvalue=_optimise_for)
+    if optimise_for is None:
+        raise AbortAction()
+    if optimise_for.strip().lower() not in COST_MODELS:
+        messagebox.showerror("Cannot perform optimisation", "The goal must be one of {}".format(", ".join(COST_MODELS)))
+        raise AbortAction()
+
+    _optimise_for = optimise_for.strip().lower()
+    model = COST_MODELS[_optimise_for]
+    return model(ask_motion_profile()) if model.unit == "seconds" else model()
 
 
 def autofix(layers, colours, selections, update_statusbar, update_canvas, canvas):
@@ -21,8 +67,44 @@ def autofix(layers, colours, selections, update_statusbar, update_canvas, canvas
     else:
         update_statusbar("Fixing {} layers...".format(len(selections)))
 
+    cache = default_cache()
+    cache.reset_counts()
+
+    for layer in selections:
+        layers[layer] = autofix_layer(layers[layer], cache.run)
+
+    post_fix = sum([len(layers[l]) for l in selections])
+
+    prefix = "Layer '{}' had".format(selections[0]) if len(selections) == 1 else "Selected layers had"
+
+    update_statusbar("{} {} lines, reduced to {} ({}% saving, {})".format(
+        prefix,
+        pre_fix,
+        post_fix,
+        int((1-(post_fix/pre_fix))*100),
+        cache.describe()
+    ))
+
+    return layers, colours
+
+
+def merge_lines(layers, colours, selections, update_statusbar, update_canvas, canvas):
+    if not layers:
+        messagebox.showerror("Cannot merge lines", "You must load a file first")
+        raise AbortAction()
+
+    if not selections:
+        messagebox.showerror("Cannot merge lines", "You must select one or more layers to merge")
+        raise AbortAction()
+
+    pre_fix = sum([len(layers[l]) for l in selections])
+    if len(selections) == 1:
+        update_statusbar("Merging colinear lines in '{}'...".format(selections[0]))
+    else:
+        update_statusbar("Merging colinear lines in {} layers...".format(len(selections)))
+
     for layer in selections:
-        layers[layer] = join_lines(layers[layer])
+        layers[layer] = merge_colinear(layers[layer])
 
     post_fix = sum([len(layers[l]) for l in selections])
 
@@ -38,6 +120,85 @@ def autofix(layers, colours, selections, update_statusbar, update_canvas, canvas
     return layers, colours
 
 
+def simplify(layers, colours, selections, update_statusbar, update_canvas, canvas):
+    if not layers:
+        messagebox.showerror("Cannot simplify", "You must load a file first")
+        raise AbortAction()
+
+    if not selections:
+        messagebox.showerror("Cannot simplify", "You must select one or more layers to simplify")
+        raise AbortAction()
+
+    tolerance = simpledialog.askfloat("Simplify Tolerance", "Please enter the furthest in mm a line may move", initialvalue=0.05)
+    if tolerance is None:
+        raise AbortAction()
+    profile = ask_motion_profile()
+
+    pre_fix = sum([len(layers[l]) for l in selections])
+    pre_time = sum([estimated_motion_time(layers[l], profile) for l in selections])
+    if len(selections) == 1:
+        update_statusbar("Simplifying '{}'...".format(selections[0]))
+    else:
+        update_statusbar("Simplifying {} layers...".format(len(selections)))
+
+    for layer in selections:
+        layers[layer] = simplify_lines(layers[layer], tolerance)
+
+    post_fix = sum([len(layers[l]) for l in selections])
+    post_cost = sum([cost.estimate(layers[l]) for l in selections])
+
+    prefix = "Layer '{}' had".format(selections[0]) if len(selections) == 1 else "Selected layers had"
+
+    update_statusbar("{} {} lines, reduced to {} ({}% saving), should take ~{} seconds rather than ~{}".format(
+        prefix,
+        pre_fix,
+        post_fix,
+        int((1-(post_fix/pre_fix))*100),
+        int(round(post_time, 0)),
+        int(round(pre_time, 0))
+    ))
+
+    return layers, colours
+
+
+def fit_curves(layers, colours, selections, update_statusbar, update_canvas, canvas):
+    if not layers:
+        messagebox.showerror("Cannot fit arcs", "You must load a file first")
+        raise AbortAction()
+
+    if not selections:
+        messagebox.showerror("Cannot fit arcs", "You must select one or more layers to fit arcs to")
+        raise AbortAction()
+
+    tolerance = simpledialog.askfloat("Arc Tolerance", "Please enter the furthest in mm an arc may stray from the lines it replaces", initialvalue=0.05)
+    if tolerance is None:
+        raise AbortAction()
+
+    pre_fix = sum([len(layers[l]) for l in selections])
+    if len(selections) == 1:
+        update_statusbar("Fitting arcs to '{}'...".format(selections[0]))
+    else:
+        update_statusbar("Fitting arcs to {} layers...".format(len(selections)))
+
+    for layer in selections:
+        layers[layer] = fit_arcs(layers[layer], tolerance)
+
+    post_fix = sum([len(layers[l]) for l in selections])
+    arcs = sum([sum(1 for line in layers[l] if isinstance(line, Arc)) for l in selections])
+
+    prefix = "Layer '{}' had".format(selections[0]) if len(selections) == 1 else "Selected layers had"
+
+    update_statusbar("{} {} lines, reduced to {} including {} arcs ({}% saving)".format(
+        prefix,
+        pre_fix,
+        post_fix,
+        arcs,
+        int((1-(post_fix/pre_fix))*100) if pre_fix else 0
+    ))
+
+    return layers, colours
+
+
 def optimise(layers, colours, selections, update_statusbar, update_canvas, canvas):
     if not layers:
         messagebox.showerror("Cannot perform optimisation", "You must load a file first")
@@ -47,24 +208,83 @@ def optimise(layers, colours, selections, update_statusbar, update_canvas, canva
         messagebox.showerror("Cannot perform optimisation", "You must select one or more layers to optimise")
         raise AbortAction()
 
+    time_budget = simpledialog.askfloat("Optimisation Time", "Please enter the time in seconds to spend improving the selected layers", initialvalue=5)
+    cost = ask_cost_model()
+
     pre_fix = sum([ideal_laser_distance(layers[l]) for l in selections])
+    pre_cost = sum([cost.estimate(layers[l]) for l in selections])
     if len(selections) == 1:
         update_statusbar("Optimising '{}'...".format(selections[0]))
     else:
         update_statusbar("Optimising {} layers...".format(len(selections)))
 
-    for layer in selections:
-        layers[layer] = optimise_line_set_ordering(layers[layer])
+    cache = default_cache()
+    cache.reset_counts()
+
+    optimise_layers(layers, selections, time_budget, cost, cache.run)
 
     post_fix = sum([ideal_laser_distance(layers[l]) for l in selections])
+    post_cost = sum([cost.estimate(layers[l]) for l in selections])
 
     prefix = "Layer '{}' travelled".format(selections[0]) if len(selections) == 1 else "Selected layers travelled"
 
-    update_statusbar("{} {}mm, reduced to {}mm ({}% saving)".format(
+    saving = ", predicted to save ~{} seconds of ~{}".format(round(pre_cost - post_cost, 1), int(round(pre_cost, 0))) if cost.unit == "seconds" else ""
+
+    update_statusbar("{} {}mm, reduced to {}mm ({}% saving){} ({})".format(
         prefix,
         round(pre_fix, 1),
         round(post_fix, 1),
-        int((1-(post_fix/pre_fix))*100)
+        int((1-(post_fix/pre_fix))*100),
+        saving,
+        cache.describe()
+    ))
+
+    return layers, colours
+
+
+def optimise_contours(layers, colours, selections, update_statusbar, update_canvas, canvas):
+    if not layers:
+        messagebox.showerror("Cannot perform optimisation", "You must load a file first")
+        raise AbortAction()
+
+    if not selections:
+        messagebox.showerror("Cannot perform optimisation", "You must select one or more layers to optimise")
+        raise AbortAction()
+
+    time_budget = simpledialog.askfloat("Optimisation Time", "Please enter the time in seconds to spend improving the selected layers", initialvalue=5)
+    cost = ask_cost_model()
+
+    pre_fix = sum([ideal_laser_distance(layers[l]) for l in selections])
+    pre_cost = sum([cost.estimate(layers[l]) for l in selections])
+    pre_transitions = sum([laser_transitions(layers[l]) for l in selections])
+    if len(selections) == 1:
+        update_statusbar("Optimising contours in '{}'...".format(selections[0]))
+    else:
+        update_statusbar("Optimising contours in {} layers...".format(len(selections)))
+
+    budgets = budget_shares([len(layers[l]) for l in selections], time_budget or 0)
+    for layer, budget in zip(selections, budgets):
+        chains = order_chains(chain_lines(layers[layer]))
+        if budget:
+            chains = improve_chain_ordering(chains, budget, cost=cost)
+        layers[layer] = flatten_chains(layers[layer], chains)
+
+    post_fix = sum([ideal_laser_distance(layers[l]) for l in selections])
+    post_cost = sum([cost.estimate(layers[l]) for l in selections])
+    post_transitions = sum([laser_transitions(layers[l]) for l in selections])
+
+    prefix = "Layer '{}' travelled".format(selections[0]) if len(selections) == 1 else "Selected layers travelled"
+
+    saving = ", predicted to save ~{} seconds of ~{}".format(round(pre_cost - post_cost, 1), int(round(pre_cost, 0))) if cost.unit == "seconds" else ""
+
+    update_statusbar("{} {}mm with {} laser starts, reduced to {}mm with {} ({}% saving){}".format(
+        prefix,
+        round(pre_fix, 1),
+        pre_transitions,
+        round(post_fix, 1),
+        post_transitions,
+        int((1-(post_fix/pre_fix))*100),
+        saving
     ))
 
     return layers, colours
@@ -80,21 +300,19 @@ def explode(layers, colours, selections, update_statusbar, update_canvas, canvas
         raise AbortAction()
 
     new_layers = []
+    cache = default_cache()
+    cache.reset_counts()
 
     for layer_name in selections:
         layer = layers[layer_name]
         del layers[layer_name]
 
-        new_layers = collate_lines(layer)
-        if len(new_layers) == 1:
-            layers[layer_name] = new_layers[0]
-        else:
-            for n, new_layer in enumerate(new_layers):
-                new_name = "{} {}".format(layer_name, n + 1)
-                layers[new_name] = new_layer
-                colours[new_name] = colours[layer_name]
+        new_layers = explode_layer(layer_name, layer, cache.run)
+        for new_name, new_layer in new_layers:
+            layers[new_name] = new_layer
+            colours[new_name] = colours[layer_name]
 
-    update_statusbar("Created {} new layers".format(len(new_layers)))
+    update_statusbar("Created {} new layers ({})".format(len(new_layers), cache.describe()))
 
     return layers, colours
 
@@ -108,21 +326,22 @@ def laser_estimation(layers, colours, selections, update_statusbar, update_canva
         messagebox.showerror("Cannot estimate laser time", "You must select one or more layers to estimate")
         raise AbortAction()
 
-    idle_speed = simpledialog.askfloat("Idle Speed", "Please enter the tool idle speed", initialvalue=100)
-    active_speed = simpledialog.askfloat("Active Speed", "Please enter the tool active speed", initialvalue=35)
-
+    profile = ask_motion_profile()
     time = 0
+    constant_time = 0
 
     for layer_name in selections:
         layer = layers[layer_name]
 
-        time += estimated_laser_time(layer, idle_speed, active_speed)
+        time += estimated_motion_time(layer, profile)
+        constant_time += estimated_laser_time(layer, profile.idle_speed, profile.active_speed)
 
     prefix = "This layer" if len(selections) == "1" else "These layers"
 
-    update_statusbar("{} should take ~{} seconds".format(
+    update_statusbar("{} should take ~{} seconds (~{} seconds ignoring acceleration)".format(
         prefix,
-        int(round(time, 0))
+        int(round(time, 0)),
+        int(round(constant_time, 0))
     ))
 
     return layers, colours
@@ -145,16 +364,75 @@ def laser_engraving_estimation(layers, colours, selections, update_statusbar, up
 
     lines = sum((list(layers[layer_name]) for layer_name in selections), [])
 
-    idle_time, time = estimated_engrave_time(lines, active_speed, idle_speed, scanline, update_canvas, canvas)
+    canvas_height = canvas.winfo_height()
+    preview = []
+
+    def show_progress(done, total, scanline):
+        for item in preview:
+            canvas.delete(item)
+        preview.clear()
+
+        if scanline.min_x is not None:
+            start = (Vec2(scanline.min_x, scanline.y) - canvas.dxf_midpoint) * canvas.drawing_ratio + canvas.midpoint
+            end = (Vec2(scanline.max_x, scanline.y) - canvas.dxf_midpoint) * canvas.drawing_ratio + canvas.midpoint
+            preview.append(canvas.create_line(start.x, start.y * -1 + canvas_height, end.x, end.y * -1 + canvas_height, fill="red", width=3))
+
+        update_statusbar("Estimating engraving time ({}%)".format(int(done / total * 100)))
+
+    estimate = estimated_engrave_time(lines, active_speed, idle_speed, scanline, progress=show_progress)
 
     update_statusbar("Engraving will take ~{} seconds, spending ~{} seconds idle".format(
-        int(round(time, 0)),
-        int(round(idle_time, 0))
+        int(round(estimate.time, 0)),
+        int(round(estimate.idle_time, 0))
     ))
 
     return layers, colours
 
 
+def check_crossings(layers, colours, selections, update_statusbar, update_canvas, canvas):
+    if not layers:
+        messagebox.showerror("Cannot check crossings", "You must load a file first")
+        raise AbortAction()
+
+    if not selections:
+        messagebox.showerror("Cannot check crossings", "You must select one or more layers to check")
+        raise AbortAction()
+
+    if len(selections) == 1:
+        update_statusbar("Checking '{}' for crossings...".format(selections[0]))
+    else:
+        update_statusbar("Checking {} layers for crossings...".format(len(selections)))
+
+    crossings = {layer_name: find_crossings(layers[layer_name]) for layer_name in selections}
+    count = sum(len(layer_crossings) for layer_crossings in crossings.values())
+
+    canvas.highlights = [crossing.point for layer_crossings in crossings.values() for crossing in layer_crossings]
+    update_canvas()
+
+    prefix = "Layer '{}' has".format(selections[0]) if len(selections) == 1 else "Selected layers have"
+
+    if not count:
+        update_statusbar("{} no crossing lines".format(prefix))
+        return layers, colours
+
+    update_statusbar("{} {} crossings, highlighted in red".format(prefix, count))
+
+    if not messagebox.askyesno("Split Crossings", "Found {} crossings, split the lines where they cross?".format(count)):
+        return layers, colours
+
+    pre_fix = sum([len(layers[l]) for l in selections])
+
+    for layer_name in selections:
+        layers[layer_name] = split_at_crossings(layers[layer_name], crossings[layer_name])
+
+    post_fix = sum([len(layers[l]) for l in selections])
+    canvas.highlights = []
+
+    update_statusbar("Split {} crossings, {} lines became {}".format(count, pre_fix, post_fix))
+
+    return layers, colours
+
+
 def add_tabs(layers, colours, selections, update_statusbar, update_canvas, canvas):
     if not layers:
         messagebox.showerror("Cannot add tabs", "You must load a file first")
@@ -172,12 +450,7 @@ def add_tabs(layers, colours, selections, update_statusbar, update_canvas, canva
 
         # TODO: Use collate_lines to explode, convert to polygons
 
-        new_layer = []
-        for line in layer:
-            _, new_lines = line.add_tab(tab_distance, tab_width)
-            new_layer += new_lines
-
-            layers[layer_name] = new_layer
+        layers[layer_name] = tab_lines(layer, tab_distance, tab_width)
 
     if len(selections) == 1:
         update_statusbar("Added tabs to '{}'".format(selections[0]))
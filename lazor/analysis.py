@@ -1,42 +1,55 @@
+import heapq
 import math
 import random
+from collections import defaultdict
 from functools import reduce
+from time import monotonic
+from typing import NamedTuple, Optional, List, Tuple
 
-from lazor.datastructures import Line, LineSet, Vec2
+import numpy as np
+
+from lazor.datastructures import Line, Arc, LineSet, Vec2, SpatialHash, \
+    DisjointSet, LineArray, KDTree
 
 
 def join_lines(lines, unify_distance=0.01):
     edges = set()
+    arcs = {}
     verts_set = []
+    grid = SpatialHash(unify_distance)
 
-    for line in lines:
-        start_v = None
-        end_v = None
-        for v, vert_set in enumerate(verts_set):
-            if start_v is not None and end_v is not None:
-                break
+    def nearest_set(point):
+        found = None
+        for vert, v in grid.near(point):
+            if (found is None or v < found) and point.distance(vert) < unify_distance:
+                found = v
+        return found
+
+    def add_to_set(v, point):
+        if point not in verts_set[v]:
+            verts_set[v].add(point)
+            grid.add(point, v)
 
-            for vert in vert_set:
-                if start_v is None and line.start.distance(vert) < unify_distance:
-                    start_v = v
-                if end_v is None and line.end.distance(vert) < unify_distance:
-                    end_v = v
+    for line in lines:
+        start_v = nearest_set(line.start)
+        end_v = nearest_set(line.end)
 
         if start_v is None:
             start_v = len(verts_set)
-            verts_set.append({line.start})
-        else:
-            verts_set[start_v].add(line.start)
+            verts_set.append(set())
+        add_to_set(start_v, line.start)
         if end_v is None:
             end_v = len(verts_set)
-            verts_set.append({line.end})
-        else:
-            verts_set[end_v].add(line.end)
+            verts_set.append(set())
+        add_to_set(end_v, line.end)
 
-        edge = frozenset((start_v, end_v))
-        if len(edge) != 2:
+        if start_v == end_v:
+            continue
+        if line.bulge:
+            # Arcs are only merged with the same arc, not with their chords.
+            arcs[(start_v, end_v, line.bulge) if start_v < end_v else (end_v, start_v, -line.bulge)] = None
             continue
-        edges.add(edge)
+        edges.add(frozenset((start_v, end_v)))
 
     verts = []
     for vert_set in verts_set:
@@ -52,34 +65,189 @@ def join_lines(lines, unify_distance=0.01):
 
         new_lines.append(Line(start, end))
 
+    for start_v, end_v, bulge in arcs:
+        if verts[start_v].distance(verts[end_v]) >= unify_distance:
+            new_lines.append(Arc(verts[start_v], verts[end_v], bulge))
+
+    if isinstance(lines, LineArray):
+        return LineArray.from_lines(new_lines)
     return new_lines
 
 
+def remove_overlaps(lines, unify_distance=0.01, angle_tolerance=0.001):
+    """
+    Merges colinear lines that partially or wholly overlap, so shared edges
+    are only cut once. Lines are bucketed by their angle, modulo a half turn,
+    and distance from the origin, and neighbouring buckets are joined so
+    lines either side of a bucket boundary still meet. Each group's
+    intervals along its line are then merged in sorted order, so long as
+    the merged lines lie within `unify_distance` of the first line in the
+    run. A merged run keeps the original end points furthest apart, and
+    lines that merely touch end to end are left alone.
+    """
+
+    if not isinstance(lines, LineArray):
+        lines = list(lines)
+    array = LineArray.from_lines(lines)
+    coords = array.coords.tolist()
+    bulges = [0.0] * len(coords) if array.bulges is None else array.bulges.tolist()
+
+    # Arcs are kept as they are.
+    merged = [(n, None) for n, bulge in enumerate(bulges) if bulge]
+
+    angles = math.ceil(math.pi / angle_tolerance)
+    buckets = defaultdict(list)
+    for n, ((x0, y0), (x1, y1)) in enumerate(coords):
+        dx, dy = x1 - x0, y1 - y0
+        length = math.hypot(dx, dy)
+        if length == 0 or bulges[n]:
+            continue
+        if dy < 0 or (dy == 0 and dx < 0):
+            dx, dy = -dx, -dy
+        ux, uy = dx / length, dy / length
+
+        angle = min(int(math.atan2(uy, ux) / angle_tolerance), angles - 1)
+        offset = math.floor((y0 * ux - x0 * uy) / unify_distance)
+        buckets[angle, offset].append(n)
+
+    # Lines in the last angle bucket point the opposite way to those in the
+    # first, so their offsets have the opposite sign.
+    components = DisjointSet()
+    for angle, offset in buckets:
+        components.find((angle, offset))
+        for neighbour in (angle - 1, angle, angle + 1):
+            base = offset if 0 <= neighbour < angles else -offset - 1
+            for neighbour_offset in (base - 1, base, base + 1):
+                key = neighbour % angles, neighbour_offset
+                if key in buckets:
+                    components.union((angle, offset), key)
+
+    groups = defaultdict(list)
+    for key, members in buckets.items():
+        groups[components.find(key)] += members
+
+    def colinear(a, b):
+        (ax0, ay0), (ax1, ay1) = a[3], a[4]
+        length = a[1] - a[0]
+        return all(abs((ax1 - ax0) * (y - ay0) - (ay1 - ay0) * (x - ax0)) <= unify_distance * length for x, y in b[3:])
+
+    for members in groups.values():
+        if len(members) == 1:
+            merged.append((members[0], None))
+            continue
+
+        (x0, y0), (x1, y1) = coords[members[0]]
+        length = math.hypot(x1 - x0, y1 - y0)
+        ux, uy = (x1 - x0) / length, (y1 - y0) / length
+
+        group = []
+        for n in members:
+            (x0, y0), (x1, y1) = coords[n]
+            start, end = x0 * ux + y0 * uy, x1 * ux + y1 * uy
+            if start <= end:
+                group.append((start, end, n, (x0, y0), (x1, y1)))
+            else:
+                group.append((end, start, n, (x1, y1), (x0, y0)))
+        group.sort()
+
+        # Joined buckets can hold parallel lines that aren't colinear, so
+        # each interval joins the first run it overlaps and lies along out
+        # of those still open with a nearby offset.
+        runs = []
+        open_runs = defaultdict(list)
+        for interval in group:
+            x, y = interval[3]
+            offset = math.floor((y * ux - x * uy) / unify_distance)
+            for key in (offset - 1, offset, offset + 1):
+                if key not in open_runs:
+                    continue
+                candidates = open_runs[key] = [entry for entry in open_runs[key] if interval[0] < entry[1] - unify_distance]
+                entry = next((entry for entry in candidates if colinear(entry[0][0], interval)), None)
+                if entry is not None:
+                    entry[0].append(interval)
+                    entry[1] = max(entry[1], interval[1])
+                    break
+            else:
+                runs.append([interval])
+                open_runs[offset].append([runs[-1], interval[1]])
+
+        for run in runs:
+            if len(run) == 1:
+                merged.append((run[0][2], None))
+            else:
+                first = min(interval[2] for interval in run)
+                merged.append((first, (run[0][3], max(run, key=lambda interval: interval[1])[4])))
+
+    merged.sort()
+
+    if isinstance(lines, LineArray):
+        return LineArray([coords[n] if line is None else line for n, line in merged],
+                         None if array.bulges is None else [bulges[n] if line is None else 0.0 for n, line in merged])
+    return [lines[n] if line is None else Line(Vec2(*line[0]), Vec2(*line[1])) for n, line in merged]
+
+
 def collate_lines(lines):
-    line_sets = []
+    components = DisjointSet()
+    unique_lines = []
+    seen = set()
+    closing_lines = []
 
     for line in lines:
-        disconnected = []
-        connected = []
-        for line_set in line_sets:
-            if line_set.connected(line):
-                connected.append(line_set)
-            else:
-                disconnected.append(line_set)
+        if line in seen:
+            continue
+        seen.add(line)
+        unique_lines.append(line)
+
+        if not components.union(line.start, line.end) and line.start != line.end:
+            closing_lines.append(line)
+
+    groups = {}
+    for line in unique_lines:
+        groups.setdefault(components.find(line.start), []).append(line)
+
+    loops = {components.find(line.start) for line in closing_lines}
+
+    return [LineSet.from_lines(group, loop=root in loops) for root, group in groups.items()]
+
+
+def uncached(function, layer, **params):
+    return function(layer, **params)
+
+
+def autofix_layer(layer, run=uncached):
+    """
+    Welds nearby vertices together then removes overlapping lines, as
+    Autofix does. Each stage is called through `run`, which may be a
+    `ResultCache.run`.
+    """
+
+    return run(remove_overlaps, run(join_lines, layer))
 
-        if not connected:
-            line_sets.append(LineSet(line))
-        else:
-            new_set = LineSet(line)
-            for other in connected:
-                new_set.merge(other)
-            line_sets = disconnected + [new_set]
 
-    return line_sets
+def explode_layer(name, layer, run=uncached):
+    """
+    Splits a layer into its connected parts, as Explode does, returning
+    (name, lines) pairs numbered after `name`, or just the layer itself if
+    it is all one part.
+    """
+
+    parts = run(collate_lines, layer)
+    if len(parts) == 1:
+        return [(name, parts[0])]
+    return [("{} {}".format(name, n + 1), part) for n, part in enumerate(parts)]
+
+
+def tab_lines(lines, tab_distance, tab_width):
+    new_lines = []
+    for line in lines:
+        _, tabbed = line.add_tab(tab_distance, tab_width)
+        new_lines += tabbed
+
+    return new_lines
 
 
 def minimum_laser_distance(lines):
-    return sum(line.length() for line in lines)
+    return float(LineArray.from_lines(lines).lengths().sum())
 
 
 def ideal_laser_distance(layer):
@@ -90,16 +258,9 @@ def ideal_laser_distance(layer):
     line.
     """
 
-    travel = 0
-    current_cord = layer[0].start
-
-    for line in layer:
-        travel += current_cord.distance(line.start)
-        travel += line.length()
+    lines = LineArray.from_lines(layer)
 
-        current_cord = line.end
-
-    return travel
+    return float(lines.travel_lengths().sum() + lines.lengths().sum())
 
 
 def estimated_laser_time(layer, idle_speed, active_speed):
@@ -110,123 +271,764 @@ def estimated_laser_time(layer, idle_speed, active_speed):
     line.
     """
 
-    travel = 0
-    current_cord = layer[0].start
+    lines = LineArray.from_lines(layer)
+
+    return float(lines.travel_lengths().sum() / idle_speed + lines.lengths().sum() / active_speed)
+
+
+class MotionProfile(NamedTuple):
+    idle_speed: float = 100
+    active_speed: float = 35
+    acceleration: float = 500
+    junction_deviation: float = 0.01
+
+
+def junction_speeds(exits, entries, acceleration, deviation):
+    """
+    The squared speeds at which moves leaving along the (N, 2) unit vectors
+    `exits` can turn onto moves entering along `entries`, by the junction
+    deviation model GRBL uses: the corner is taken as an arc that strays
+    `deviation` from it, at the speed `acceleration` allows round that arc.
+    Straight on is unlimited and reversing needs a stop.
+    """
+
+    cosines = -(exits * entries).sum(axis=1)
+    sines = np.sqrt(np.clip((1 - cosines) / 2, 0, 1))
+    with np.errstate(divide="ignore"):
+        return np.where(sines < 1 - 1e-9, acceleration * deviation * sines / (1 - sines), np.inf)
+
+
+def trapezoid_times(lengths, entries, exits, cruise, acceleration):
+    """
+    The time each move takes with a trapezoidal speed profile, accelerating
+    from the squared speed `entries` towards `cruise` then decelerating to
+    the squared speed `exits`, or a triangular one for moves too short to
+    reach `cruise`.
+    """
+
+    peaks = np.minimum((2 * acceleration * lengths + entries + exits) / 2, cruise ** 2)
+    peak_speeds = np.sqrt(peaks)
+    cruising = np.maximum(lengths - (2 * peaks - entries - exits) / (2 * acceleration), 0)
+    return (2 * peak_speeds - np.sqrt(entries) - np.sqrt(exits)) / acceleration + cruising / peak_speeds
+
+
+def estimated_motion_time(layer, profile=MotionProfile()):
+    """
+    Estimates the time to cut a layer in order as `estimated_laser_time`
+    does, but with the head accelerating and decelerating at
+    `profile.acceleration` and slowing for corners by the junction
+    deviation model, as the motion planners in laser controllers do. The
+    head starts and finishes at rest, and arcs are limited to the speed
+    their curvature allows.
+    """
+
+    lines = LineArray.from_lines(layer)
+    if not len(lines):
+        return 0.0
+
+    acceleration = profile.acceleration
+    start_tangents, end_tangents = lines.tangents()
+    travel = lines.starts[1:] - lines.ends[:-1]
+    travel_lengths = lines.travel_lengths()
+    travel_directions = np.divide(travel, travel_lengths[:, None], out=np.zeros_like(travel), where=travel_lengths[:, None] > 0)
+
+    count = 2 * len(lines) - 1
+    lengths = np.empty(count)
+    lengths[0::2] = lines.lengths()
+    lengths[1::2] = travel_lengths
+    entries = np.empty((count, 2))
+    entries[0::2] = start_tangents
+    entries[1::2] = travel_directions
+    exits = np.empty((count, 2))
+    exits[0::2] = end_tangents
+    exits[1::2] = travel_directions
+    cruise = np.empty(count)
+    cruise[0::2] = profile.active_speed
+    cruise[1::2] = profile.idle_speed
+    if lines.bulges is not None:
+        arcs = lines.bulges != 0
+        radii = np.hypot(*(lines.starts[arcs] - lines.centres()[arcs]).T)
+        cruise[0::2][arcs] = np.minimum(profile.active_speed, np.sqrt(acceleration * radii))
 
-    for line in layer:
-        travel += current_cord.distance(line.start) / idle_speed
-        travel += line.length() / active_speed
+    moves = lengths > 0
+    lengths, entries, exits, cruise = lengths[moves], entries[moves], exits[moves], cruise[moves]
+    if not len(lengths):
+        return 0.0
 
-        current_cord = line.end
+    limits = np.zeros(len(lengths) + 1)
+    limits[1:-1] = np.minimum(junction_speeds(exits[:-1], entries[1:], acceleration, profile.junction_deviation),
+                              np.minimum(cruise[:-1], cruise[1:]) ** 2)
 
-    return travel
+    # Each junction's squared speed can rise by at most 2 * acceleration * length over the move before
+    # it, and fall by as much over the move after it. Both passes are running minimums in those units.
+    distance = 2 * acceleration * np.concatenate([[0], np.cumsum(lengths)])
+    speeds = distance + np.minimum.accumulate(limits - distance)
+    speeds = np.minimum.accumulate((speeds + distance)[::-1])[::-1] - distance
+    speeds = np.maximum(speeds, 0)
+
+    return float(trapezoid_times(lengths, speeds[:-1], speeds[1:], cruise, acceleration).sum())
+
+
+def nearest_endpoint_ordering(lines, start):
+    """
+    Greedily orders an (N, 2, 2) array of lines for cutting: starting at
+    `start`, the line with the endpoint nearest the laser head is cut next,
+    entering at that endpoint. Ties go to the earliest line, and to its end
+    when both of its endpoints are equally close. Returns the line indices in
+    cutting order and whether each one is cut from end to start.
+    """
+
+    # Ends come before starts so that equally close endpoints of the same
+    # line resolve to cutting it backwards.
+    endpoints = lines[:, ::-1].reshape(-1, 2)
+    tree = KDTree(endpoints)
+    xs, ys = tree.xs, tree.ys
+
+    order = []
+    flipped = []
+    x, y = start
+    for _ in range(len(lines)):
+        nearest = tree.nearest(x, y)
+        line = nearest // 2
+        tree.remove(2 * line)
+        tree.remove(2 * line + 1)
+
+        order.append(line)
+        flipped.append(nearest % 2 == 0)
+
+        exit_point = nearest + 1 if nearest % 2 == 0 else nearest - 1
+        x, y = xs[exit_point], ys[exit_point]
+
+    return order, flipped
+
+
+def apply_ordering(layer, order, flipped):
+    if isinstance(layer, LineArray):
+        coords = layer.coords[order]
+        coords[flipped] = coords[flipped, ::-1]
+        bulges = None
+        if layer.bulges is not None:
+            bulges = layer.bulges[order]
+            bulges[flipped] = -bulges[flipped]
+        return LineArray(coords, bulges)
+
+    lines = list(layer)
+    return [lines[n].reversed() if flip else lines[n] for n, flip in zip(order, flipped)]
 
 
 def optimise_line_set_ordering(layer):
-    line_sets = layer
-    ordered_lines = []
-
-    min_x, min_y = float("inf"), float("inf")
-    for line in line_sets:
-        for x, y in line:
-            min_x = min(min_x, x)
-            min_y = min(min_y, y)
-
-    last_point = Vec2(min_x, min_y)
-
-    while line_sets:
-        candidates = line_sets
-        line_sets = []
-        candidate_line = None
-        candidate_distance = float("inf")
-
-        for line in candidates:
-            if last_point.distance(line.start) < candidate_distance:
-                if candidate_line:
-                    line_sets.append(candidate_line)
-                candidate_line = Line(line.start, line.end)
-                candidate_distance = last_point.distance(line.start)
-            elif last_point.distance(line.end) < candidate_distance:
-                if candidate_line:
-                    line_sets.append(candidate_line)
-                candidate_line = Line(line.end, line.start)
-                candidate_distance = last_point.distance(line.end)
-            else:
-                line_sets.append(line)
+    if not len(layer):
+        return []
+
+    lines = LineArray.from_lines(layer)
+    order, flipped = nearest_endpoint_ordering(lines.coords, lines.bounds().min)
+
+    return apply_ordering(layer, order, flipped)
+
+
+def laser_transitions(layer):
+    """
+    Counts how many times the laser has to be switched on to cut a layer in
+    order, i.e. the first line plus every line that doesn't start where the
+    previous one ended.
+    """
+
+    lines = LineArray.from_lines(layer)
+    if not len(lines):
+        return 0
+    return int(1 + (lines.travel_lengths() > 0).sum())
+
+
+def chain_lines(layer, stop_at_junctions=False):
+    """
+    Splits a layer into chains of lines that can be cut without switching
+    the laser off, each line oriented to start where the previous one ended.
+    Chains are started from vertices joining an odd number of lines first, as
+    every such vertex must be the end of some chain. With `stop_at_junctions`
+    chains instead run between vertices that don't join exactly two lines,
+    so every chain is a simple path or a closed loop.
+    """
+
+    lines = list(layer)
+    adjacent = defaultdict(list)
+    for n, line in enumerate(lines):
+        adjacent[line.start].append(n)
+        adjacent[line.end].append(n)
+    degrees = {vert: len(edges) for vert, edges in adjacent.items()}
+
+    used = [False] * len(lines)
+    chains = []
+
+    def walk(vert):
+        chain = []
+        edges = adjacent[vert]
+        while edges:
+            n = edges.pop()
+            if used[n]:
+                continue
+            used[n] = True
+
+            line = lines[n]
+            if line.start != vert:
+                line = line.reversed()
+            chain.append(line)
+
+            vert = line.end
+            if stop_at_junctions and degrees[vert] != 2:
+                break
+            edges = adjacent[vert]
+        return chain
+
+    if stop_at_junctions:
+        starts = [vert for vert, degree in degrees.items() if degree != 2 for _ in range(degree)]
+    else:
+        starts = [vert for line in lines for vert in line if len(adjacent[vert]) % 2 == 1]
+
+    for vert in starts + [line.start for line in lines]:
+        chain = walk(vert)
+        if chain:
+            chains.append(chain)
+
+    return chains
+
+
+def straight_runs(chain):
+    """
+    Splits a chain at its arcs into a list of runs, each either a single arc
+    or a list of consecutive straight lines, in order. Closed chains
+    holding arcs are rotated to start at one so no run wraps around.
+    """
+
+    arcs = [n for n, line in enumerate(chain) if line.bulge]
+    if not arcs:
+        return [chain]
+
+    if chain[0].start == chain[-1].end:
+        chain = chain[arcs[0]:] + chain[:arcs[0]]
+
+    runs = []
+    for line in chain:
+        if line.bulge:
+            runs.append(line)
+        elif runs and isinstance(runs[-1], list):
+            runs[-1].append(line)
+        else:
+            runs.append([line])
+    return runs
+
+
+def merge_colinear(layer, angle_tolerance=0.001):
+    """
+    Replaces runs of consecutive lines along each chain that point within
+    `angle_tolerance` radians of the first line in the run with a single
+    line. Runs only pass through vertices joining exactly two lines, so
+    junctions are kept, and stop at arcs, which are kept as they are.
+    """
+
+    limit = math.sin(angle_tolerance)
+    merged = []
+
+    chains = chain_lines([line for line in layer if line.start != line.end], stop_at_junctions=True)
+    for chain in (run for chain in chains for run in straight_runs(chain)):
+        if not isinstance(chain, list):
+            merged.append(chain)
+            continue
+
+        directions = [line.normalized() for line in chain]
+
+        if len(chain) > 2 and chain[0].start == chain[-1].end:
+            corners = [n for n in range(len(chain)) if abs(directions[n - 1].cross(directions[n])) > limit or directions[n - 1].dot(directions[n]) <= 0]
+            if corners:
+                chain = chain[corners[0]:] + chain[:corners[0]]
+                directions = directions[corners[0]:] + directions[:corners[0]]
+
+        start = chain[0].start
+        anchor = directions[0]
+        for line, direction, following in zip(chain, directions, directions[1:] + [None]):
+            if following is None or abs(anchor.cross(following)) > limit or anchor.dot(following) <= 0:
+                merged.append(Line(start, line.end))
+                start = line.end
+                anchor = following
+
+    if isinstance(layer, LineArray):
+        return LineArray.from_lines(merged)
+    return merged
+
+
+def douglas_peucker(points, tolerance):
+    """
+    The indices of the points kept by Douglas-Peucker simplification of a
+    polyline, given as an (N, 2) array. Every dropped point lies within
+    `tolerance` of the simplified line between its kept neighbours, so the
+    result never strays further than that from the original.
+    """
+
+    keep = np.zeros(len(points), dtype=bool)
+    keep[[0, -1]] = True
+
+    stack = [(0, len(points) - 1)]
+    while stack:
+        first, last = stack.pop()
+        if last - first < 2:
+            continue
+
+        start, end = points[first], points[last]
+        between = points[first + 1:last] - start
+        line = end - start
+        length = line.dot(line)
+        if length:
+            along = np.clip(between.dot(line) / length, 0, 1)
+            between = between - along[:, None] * line
+        distances = np.hypot(between[:, 0], between[:, 1])
+
+        furthest = int(distances.argmax())
+        if distances[furthest] > tolerance:
+            middle = first + 1 + furthest
+            keep[middle] = True
+            stack.append((first, middle))
+            stack.append((middle, last))
+
+    return np.flatnonzero(keep)
+
+
+def simplify_lines(layer, tolerance):
+    """
+    Simplifies each chain of a layer, between junctions and arcs, with
+    `douglas_peucker`, so dense runs of short lines become as few lines
+    as possible while staying within `tolerance` of the original shape.
+    Arcs are kept as they are.
+    """
+
+    simplified = []
+    chains = chain_lines([line for line in layer if line.start != line.end], stop_at_junctions=True)
+    for chain in (run for chain in chains for run in straight_runs(chain)):
+        if not isinstance(chain, list):
+            simplified.append(chain)
+            continue
+
+        points = np.array([tuple(chain[0].start)] + [tuple(line.end) for line in chain])
+        vertices = [chain[0].start] + [line.end for line in chain]
+        kept = douglas_peucker(points, tolerance).tolist()
+        simplified.extend(Line(vertices[a], vertices[b]) for a, b in zip(kept, kept[1:]))
+
+    if isinstance(layer, LineArray):
+        return LineArray.from_lines(simplified)
+    return simplified
+
+
+def arc_bulge(points, tolerance):
+    """
+    The bulge of an arc from the first to the last of an (N, 2) array of
+    points, through the middle one, if the polyline through them turns the
+    same way at every vertex and each vertex and line midpoint lies within
+    `tolerance` of the arc. Arcs are limited to half a circle. Returns None
+    if the points don't fit.
+    """
+
+    lines = np.diff(points, axis=0)
+    turns = lines[:-1, 0] * lines[1:, 1] - lines[:-1, 1] * lines[1:, 0]
+    if not ((turns > 0).all() or (turns < 0).all()):
+        return None
 
-        if last_point.distance(candidate_line.start) < last_point.distance(candidate_line.end):
-            ordered_lines.append(Line(candidate_line.start, candidate_line.end))
-            last_point = candidate_line.end
+    first = points[0]
+    b = points[len(points) // 2] - first
+    c = points[-1] - first
+    denominator = 2 * (b[0] * c[1] - b[1] * c[0])
+    if denominator == 0:
+        return None
+    centre = first + np.array((c[1] * b.dot(b) - b[1] * c.dot(c), b[0] * c.dot(c) - c[0] * b.dot(b))) / denominator
+
+    radius = math.hypot(*(first - centre))
+    checked = np.concatenate([points, (points[:-1] + points[1:]) / 2]) - centre
+    if np.abs(np.hypot(checked[:, 0], checked[:, 1]) - radius).max() > tolerance:
+        return None
+
+    radii = points - centre
+    sweep = float(np.arctan2(radii[:-1, 0] * radii[1:, 1] - radii[:-1, 1] * radii[1:, 0],
+                             (radii[:-1] * radii[1:]).sum(axis=1)).sum())
+    if abs(sweep) > math.pi * (1 + 1e-9) or (sweep > 0) != (turns[0] > 0):
+        return None
+
+    return math.tan(sweep / 4)
+
+
+def fit_arcs(layer, tolerance=0.01, min_lines=3):
+    """
+    Replaces runs of lines lying on a common circle, as left by tessellated
+    curves, with arcs. Only lines that follow on from each other in the
+    layer's cutting order are fitted, so the order is kept, and each arc
+    replaces at least `min_lines` lines. Arcs are grown by doubling then
+    bisecting the number of lines `arc_bulge` still fits within
+    `tolerance`.
+    """
+
+    lines = LineArray.from_lines(layer)
+    coords = []
+    bulges = []
+
+    for run in lines.runs():
+        if len(run) < min_lines:
+            coords.extend(run.coords)
+            bulges.extend(np.zeros(len(run)) if run.bulges is None else run.bulges)
+            continue
+
+        run_bulges = np.zeros(len(run)) if run.bulges is None else run.bulges
+        arcs = np.append(np.flatnonzero(run_bulges), len(run))
+        points = np.concatenate([run.starts, run.ends[-1:]])
+
+        n = 0
+        while n < len(run):
+            available = int(arcs[np.searchsorted(arcs, n)]) - n
+            fits = {}
+
+            def fit(count):
+                if count not in fits:
+                    fits[count] = arc_bulge(points[n:n + count + 1], tolerance) if count <= available else None
+                return fits[count]
+
+            count = 1
+            bulge = run_bulges[n]
+            if available >= min_lines and fit(min_lines) is not None:
+                good, step = min_lines, 1
+                while fit(good + step) is not None:
+                    good += step
+                    step *= 2
+                bad = good + step
+                while bad - good > 1:
+                    middle = (good + bad) // 2
+                    if fit(middle) is None:
+                        bad = middle
+                    else:
+                        good = middle
+                count, bulge = good, fit(good)
+
+            coords.append((points[n], points[n + count]))
+            bulges.append(bulge)
+            n += count
+
+    fitted = LineArray(np.array(coords), bulges)
+    if isinstance(layer, LineArray):
+        return fitted
+    return fitted.to_lines()
+
+
+def reverse_chain(chain):
+    return [line.reversed() for line in reversed(chain)]
+
+
+def order_chains(chains):
+    """
+    Greedily orders chains for cutting in the same way as
+    `nearest_endpoint_ordering` orders lines. Open chains may be entered from
+    either end; closed chains are entered at whichever of their vertices is
+    closest, and cut round from there.
+    """
+
+    if not chains:
+        return []
+
+    points = []
+    entries = []
+    for c, chain in enumerate(chains):
+        if len(chain) > 1 and chain[0].start == chain[-1].end:
+            for k, line in enumerate(chain):
+                points.append(tuple(line.start))
+                entries.append((c, k))
         else:
-            ordered_lines.append(Line(candidate_line.end, candidate_line.start))
-            last_point = candidate_line.start
+            points.append(tuple(chain[0].start))
+            entries.append((c, 0))
+            points.append(tuple(chain[-1].end))
+            entries.append((c, -1))
+
+    first_entry = {}
+    for n, (c, _) in enumerate(entries):
+        first_entry.setdefault(c, n)
+
+    tree = KDTree(points)
+    x, y = LineArray.from_lines([line for chain in chains for line in chain]).bounds().min
+
+    ordered = []
+    for _ in range(len(chains)):
+        c, k = entries[tree.nearest(x, y)]
+        n = first_entry[c]
+        while n < len(entries) and entries[n][0] == c:
+            tree.remove(n)
+            n += 1
+
+        chain = chains[c]
+        if k == -1:
+            chain = reverse_chain(chain)
+        elif k:
+            chain = chain[k:] + chain[:k]
+        ordered.append(chain)
+
+        x, y = chain[-1].end
+
+    return ordered
 
-    return ordered_lines
 
+def flatten_chains(layer, chains):
+    lines = [line for chain in chains for line in chain]
+    if isinstance(layer, LineArray):
+        return LineArray.from_lines(lines)
+    return lines
 
-def all_intersections(candidate_y, lines):
-    return [line for line in lines if min(line.start.y, line.end.y) < candidate_y < max(line.start.y, line.end.y)]
 
+def optimise_chain_ordering(layer):
+    return flatten_chains(layer, order_chains(chain_lines(layer)))
+
+
+def sweep_scanlines(lines, start_y, pitch, count):
+    """
+    Sweeps `count` horizontal scanlines upwards from `start_y`, `pitch`
+    apart, yielding each scanline's y alongside its active edge table: the
+    lines strictly crossing that y. Edges are entered in order of their lowest
+    point and dropped once the sweep passes their highest, so each scanline
+    only touches the edges it crosses. Active edges are tuples of
+    (min_y, max_y, min_x, max_x, x0, y0, dx/dy).
+    """
+
+    edges = []
+    for (x0, y0), (x1, y1) in LineArray.from_lines(lines).coords.tolist():
+        if y0 != y1:
+            edges.append((min(y0, y1), max(y0, y1), min(x0, x1), max(x0, x1), x0, y0, (x1 - x0) / (y1 - y0)))
+    edges.sort(key=lambda edge: edge[0])
+
+    active = []
+    next_edge = 0
+    y = start_y
+    for _ in range(count):
+        active = [edge for edge in active if edge[1] > y]
+        while next_edge < len(edges) and edges[next_edge][0] < y:
+            if edges[next_edge][1] > y:
+                active.append(edges[next_edge])
+            next_edge += 1
+
+        yield y, active
+        y += pitch
+
+
+def even_odd_spans(y, active):
+    """
+    The spans of a scanline at `y` lying inside the shapes formed by its
+    active edges, using the even-odd fill rule.
+    """
+
+    crossings = sorted(x0 + (y - y0) * slope for _, _, _, _, x0, y0, slope in active)
+    return list(zip(crossings[::2], crossings[1::2]))
+
+
+class Scanline(NamedTuple):
+    y: float
+    min_x: Optional[float]
+    max_x: Optional[float]
+    spans: List[Tuple[float, float]]
+
+
+class EngraveEstimate(NamedTuple):
+    idle_time: float
+    time: float
+    scanlines: List[Scanline]
+
+
+def estimated_engrave_time(lines, active_speed, idle_speed, scanline, progress=None, progress_rate=30):
+    """
+    Estimates how long engraving the area covered by `lines` will take,
+    rastering scanlines `scanline` apart and returning the total and idle
+    time along with the extent and even-odd fill spans of every scanline.
+
+    If given, `progress` is called with the number of scanlines done, the
+    total and the latest Scanline, at most `progress_rate` times a second
+    and once more when the estimate is complete.
+    """
 
-def estimated_engrave_time(lines, active_speed, idle_speed, scanline, update_canvas, canvas):
     time = 0
     idle_time = 0
-    line_min = Vec2(float('inf'), float('inf'))
-    line_max = Vec2(float('-inf'), float('-inf'))
-    
-    for start, end in lines:
-        line_min = Vec2(min(start.x, end.x, line_min.x),
-                        min(start.y, end.y, line_min.y))
-        line_max = Vec2(max(start.x, end.x, line_max.x),
-                        max(start.y, end.y, line_max.y))
-        
-    scanlines = int(math.ceil((line_max.y - line_min.y) / scanline)) + 1
-    scan_y = line_min.y - scanline / 2
-    
-    canvas_height = canvas.winfo_height()
-
-    scanning_line = None
-
-    left = True
-    first = True
-    last_min, last_max = None, None
-    
-    for _ in range(scanlines):
-        print("left" if left else "right")
-        intersections = all_intersections(scan_y, lines)
-
-        if scanning_line:
-            canvas.delete(scanning_line)
+    bounds = LineArray.from_lines(lines).bounds()
+    line_min, line_max = bounds.min, bounds.max
+
+    count = int(math.ceil((line_max.y - line_min.y) / scanline)) + 1
+    start_y = line_min.y - scanline / 2
 
+    scanlines = []
+    last_progress = float("-inf")
+
+    for done, (scan_y, intersections) in enumerate(sweep_scanlines(lines, start_y, scanline, count), 1):
         if not intersections:
             time += scanline / idle_speed
             idle_time += scanline / idle_speed
-            scan_y += scanline
-            continue
+            scanlines.append(Scanline(scan_y, None, None, []))
+        else:
+            min_x = min(edge[2] for edge in intersections)
+            max_x = max(edge[3] for edge in intersections)
+            time += (max_x - min_x + 100) / active_speed
+            time += scanline / idle_speed
+            scanlines.append(Scanline(scan_y, min_x, max_x, even_odd_spans(scan_y, intersections)))
+
+        if progress and (done == count or monotonic() - last_progress >= 1 / progress_rate):
+            last_progress = monotonic()
+            progress(done, count, scanlines[-1])
+
+    return EngraveEstimate(idle_time, time, scanlines)
+
+
+class Crossing(NamedTuple):
+    point: Vec2
+    lines: Tuple[int, ...]
+
 
-        if not first:
-            last_min = min_x
-            last_max = max_x
-            first = False
-
-        min_x = min(min(line.start.x, line.end.x) for line in intersections)
-        max_x = max(max(line.start.x, line.end.x) for line in intersections)
-        time += (max_x - min_x + 100) / active_speed
-        if not first:
-            if left:
-                time += abs(min_x - last_min) / active_speed
+def find_crossings(lines, tolerance=1e-9):
+    """
+    Finds every point where a line crosses, or ends on, the interior of
+    another, alongside the indices of all the lines through that point.
+    Lines that only share end points do not cross.
+
+    This is the Bentley-Ottmann sweep as given by de Berg et al., sweeping
+    left to right. Each event point gathers the lines starting there (U), the
+    lines ending there (L) and the lines passing through (C). It reports a
+    crossing when C is not empty and more than one line meets, then replaces
+    L and C in the sweep status with U and C in their order just past the
+    point. New events only come from lines that become neighbours. Points
+    within `tolerance`, scaled by the size of the drawing, are treated as
+    the same point.
+    """
+
+    segments = []
+    for n, ((x0, y0), (x1, y1)) in enumerate(LineArray.from_lines(lines).coords.tolist()):
+        if (x1, y1) < (x0, y0):
+            x0, y0, x1, y1 = x1, y1, x0, y0
+        if (x0, y0) != (x1, y1):
+            slope = (y1 - y0) / (x1 - x0) if x1 != x0 else math.inf
+            segments.append((n, x0, y0, x1, y1, slope))
+
+    if not segments:
+        return []
+
+    eps = tolerance * max(1.0, max(max(abs(c) for c in segment[1:5]) for segment in segments))
+
+    uppers = defaultdict(list)
+    for segment in segments:
+        uppers[segment[1:3]].append(segment)
+        uppers[segment[3:5]]
+
+    events = list(uppers)
+    heapq.heapify(events)
+
+    status = []
+    scheduled = set()
+    crossings = []
+    reported = SpatialHash(eps)
+
+    def height(segment, x, y):
+        _, x0, y0, x1, y1, slope = segment
+        if slope == math.inf:
+            return y
+        return min(max(y0 + (x - x0) * slope, min(y0, y1)), max(y0, y1))
+
+    def intersection(a, b):
+        _, ax0, ay0, ax1, ay1, _ = a
+        _, bx0, by0, bx1, by1, _ = b
+        adx, ady, bdx, bdy = ax1 - ax0, ay1 - ay0, bx1 - bx0, by1 - by0
+
+        denominator = adx * bdy - ady * bdx
+        if denominator == 0:
+            return None
+
+        t = ((bx0 - ax0) * bdy - (by0 - ay0) * bdx) / denominator
+        u = ((bx0 - ax0) * ady - (by0 - ay0) * adx) / denominator
+        a_eps = eps / math.hypot(adx, ady)
+        b_eps = eps / math.hypot(bdx, bdy)
+
+        if not (-a_eps <= t <= 1 + a_eps and -b_eps <= u <= 1 + b_eps):
+            return None
+
+        for value, value_eps, start, end in ((t, a_eps, (ax0, ay0), (ax1, ay1)), (u, b_eps, (bx0, by0), (bx1, by1))):
+            if value <= value_eps:
+                return start
+            if value >= 1 - value_eps:
+                return end
+
+        return ax0 + t * adx, ay0 + t * ady
+
+    def schedule(a, b, x, y):
+        pair = (a[0], b[0]) if a[0] < b[0] else (b[0], a[0])
+        if pair in scheduled:
+            return
+
+        point = intersection(a, b)
+        if point is None or point <= (x, y):
+            return
+
+        scheduled.add(pair)
+        if point not in uppers:
+            uppers[point] = []
+            heapq.heappush(events, point)
+
+    while events:
+        point = heapq.heappop(events)
+        x, y = point
+        upper = uppers.pop(point)
+
+        low, high = 0, len(status)
+        while low < high:
+            middle = (low + high) // 2
+            if height(status[middle], x, y) < y - eps:
+                low = middle + 1
             else:
-                time += abs(max_x - last_max) / active_speed
+                high = middle
+        first = last = low
+        while last < len(status) and height(status[last], x, y) <= y + eps:
+            last += 1
 
-        start = (Vec2(min_x, scan_y) - canvas.dxf_midpoint) * canvas.drawing_ratio + canvas.midpoint
-        end = (Vec2(max_x, scan_y) - canvas.dxf_midpoint) * canvas.drawing_ratio + canvas.midpoint
+        through = status[first:last]
+        contains = [segment for segment in through if abs(segment[3] - x) > eps or abs(segment[4] - y) > eps]
+
+        if contains and len(upper) + len(through) > 1:
+            found = tuple(sorted(segment[0] for segment in upper + through))
+            for other, n in reported.near(Vec2(x, y)):
+                if abs(other.x - x) <= eps and abs(other.y - y) <= eps:
+                    crossings[n] = Crossing(crossings[n].point, tuple(sorted(set(crossings[n].lines + found))))
+                    break
+            else:
+                reported.add(Vec2(x, y), len(crossings))
+                crossings.append(Crossing(Vec2(x, y), found))
+
+        inserted = sorted(upper + contains, key=lambda segment: segment[5])
+        status[first:last] = inserted
+
+        if first > 0 and first < len(status):
+            schedule(status[first - 1], status[first], x, y)
+        end = first + len(inserted)
+        if inserted and end < len(status):
+            schedule(status[end - 1], status[end], x, y)
+
+    return crossings
+
+
+def split_at_crossings(lines, crossings, tolerance=1e-6):
+    """
+    Splits every line at the crossings in its interior, so crossing lines
+    instead meet at shared end points. Crossings within `tolerance` of a
+    line's ends are ignored.
+    """
 
-        scanning_line = canvas.create_line(start.x, start.y * -1 + canvas_height, end.x, end.y * -1 + canvas_height, fill="red", width=3)
-        canvas.update()
+    cuts = defaultdict(list)
+    for crossing in crossings:
+        for n in crossing.lines:
+            cuts[n].append(crossing.point)
 
-        time += scanline / idle_speed
-        scan_y += scanline
+    split = []
+    for n, line in enumerate(lines):
+        length = line.length()
+        points = []
+        for point in cuts.get(n, ()):
+            along = (point - line.start).dot(line.normalized()) if length else 0
+            if tolerance < along < length - tolerance:
+                points.append((along, point))
 
-        left = not left
+        vertices = [line.start] + [point for _, point in sorted(points)] + [line.end]
+        split.extend(Line(start, end) for start, end in zip(vertices, vertices[1:]))
 
-    return idle_time, time
+    if isinstance(lines, LineArray):
+        return LineArray.from_lines(split)
+    return split
@@ -0,0 +1,225 @@
+import argparse
+import os
+import sys
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from lazor.analysis import ideal_laser_distance, autofix_layer, explode_layer, \
+    tab_lines, merge_colinear, simplify_lines, fit_arcs, \
+    estimated_motion_time, MotionProfile
+from lazor.cache import ResultCache, NoCache, DEFAULT_DIRECTORY
+from lazor.dxf import read, write
+from lazor import gcode
+from lazor.tour import optimise_layers, COST_MODELS
+
+
+def profile(options):
+    return MotionProfile(options.idle_speed, options.active_speed, options.acceleration, options.junction_deviation)
+
+
+def autofix(layers, colours, options, cache, report):
+    pre_fix = sum(len(layer) for layer in layers.values())
+
+    for name in layers:
+        layers[name] = autofix_layer(layers[name], cache.run)
+
+    post_fix = sum(len(layer) for layer in layers.values())
+    report("{} lines, reduced to {}".format(pre_fix, post_fix))
+
+    return layers, colours
+
+
+def merge(layers, colours, options, cache, report):
+    pre_fix = sum(len(layer) for layer in layers.values())
+
+    for name in layers:
+        layers[name] = merge_colinear(layers[name])
+
+    post_fix = sum(len(layer) for layer in layers.values())
+    report("{} lines, reduced to {}".format(pre_fix, post_fix))
+
+    return layers, colours
+
+
+def simplify(layers, colours, options, cache, report):
+    pre_fix = sum(len(layer) for layer in layers.values())
+    pre_time = sum(estimated_motion_time(layer, profile(options)) for layer in layers.values())
+
+    for name in layers:
+        layers[name] = simplify_lines(layers[name], options.simplify_tolerance)
+
+    post_fix = sum(len(layer) for layer in layers.values())
+    post_time = sum(estimated_motion_time(layer, profile(options)) for layer in layers.values())
+    report("{} lines, simplified to {}".format(pre_fix, post_fix))
+    report("predicted {} seconds, reduced to {}".format(round(pre_time, 1), round(post_time, 1)))
+
+    return layers, colours
+
+
+def explode(layers, colours, options, cache, report):
+    exploded = OrderedDict()
+    exploded_colours = {}
+
+    for name, layer in layers.items():
+        for new_name, new_layer in explode_layer(name, layer, cache.run):
+            exploded[new_name] = new_layer
+            exploded_colours[new_name] = colours[name]
+
+    report("{} layers, exploded to {}".format(len(layers), len(exploded)))
+
+    return exploded, exploded_colours
+
+
+def optimise(layers, colours, options, cache, report):
+    cost = COST_MODELS[options.optimise_for](profile(options))
+    pre_fix = sum(ideal_laser_distance(layer) for layer in layers.values())
+    pre_cost = sum(cost.estimate(layer) for layer in layers.values())
+
+    optimise_layers(layers, list(layers), options.optimise_time, cost, cache.run, workers=1)
+
+    post_fix = sum(ideal_laser_distance(layer) for layer in layers.values())
+    post_cost = sum(cost.estimate(layer) for layer in layers.values())
+    report("travelled {}mm, reduced to {}mm".format(round(pre_fix, 1), round(post_fix, 1)))
+    if cost.unit == "seconds":
+        report("predicted {} seconds, reduced to {}".format(round(pre_cost, 1), round(post_cost, 1)))
+
+    return layers, colours
+
+
+def tabs(layers, colours, options, cache, report):
+    for name in layers:
+        layers[name] = tab_lines(layers[name], options.tab_distance, options.tab_width)
+
+    report("added tabs every {}mm".format(options.tab_distance))
+
+    return layers, colours
+
+
+def arcs(layers, colours, options, cache, report):
+    pre_fix = sum(len(layer) for layer in layers.values())
+
+    for name in layers:
+        layers[name] = fit_arcs(layers[name], options.arc_tolerance)
+
+    post_fix = sum(len(layer) for layer in layers.values())
+    report("{} lines, fitted to {}".format(pre_fix, post_fix))
+
+    return layers, colours
+
+
+def estimate(layers, colours, options, cache, report):
+    time = sum(estimated_motion_time(layer, profile(options)) for layer in layers.values())
+
+    report("should take ~{} seconds".format(int(round(time, 0))))
+
+    return layers, colours
+
+
+STEPS = OrderedDict([
+    ("autofix", autofix),
+    ("merge", merge),
+    ("simplify", simplify),
+    ("explode", explode),
+    ("optimise", optimise),
+    ("tabs", tabs),
+    ("arcs", arcs),
+    ("estimate", estimate),
+])
+
+
+def process_file(source, destination, options):
+    messages = []
+    cache = NoCache() if options.no_cache else ResultCache(options.cache_dir)
+
+    layers, colours = read(source)
+    layers = OrderedDict((name, layer) for name, layer in layers.items() if len(layer))
+
+    for step in options.steps:
+        layers, colours = STEPS[step](layers, colours, options, cache, lambda msg: messages.append("{}: {}".format(step, msg)))
+
+    messages.append(cache.describe())
+
+    if options.gcode:
+        gcode.write(os.path.splitext(destination)[0] + ".gcode", layers, colours)
+    else:
+        write(destination, layers, colours, polylines=options.polylines)
+
+    return messages
+
+
+def parse_steps(value):
+    steps = [step.strip() for step in value.split(",") if step.strip()]
+    for step in steps:
+        if step not in STEPS:
+            raise argparse.ArgumentTypeError("unknown step '{}', expected one of {}".format(step, ", ".join(STEPS)))
+    return steps
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(
+        prog="python -m lazor.batch",
+        description="Processes every DXF file in a directory through a chain of LAZOR operations."
+    )
+    parser.add_argument("source", help="directory of DXF files to process")
+    parser.add_argument("destination", help="directory to write processed DXF files to")
+    parser.add_argument("--steps", type=parse_steps, default=["autofix", "optimise"],
+                        help="comma separated steps to run in order, from {} (default: autofix,optimise)".format(",".join(STEPS)))
+    parser.add_argument("--workers", type=int, default=None, help="number of files to process at once (default: one per core)")
+    parser.add_argument("--optimise-time", type=float, default=5, help="seconds spent improving the ordering of each file's layers, shared between them (default: 5)")
+    parser.add_argument("--optimise-for", choices=sorted(COST_MODELS), default="distance",
+                        help="what improving the ordering minimises: idle travel distance, travel time at constant speed, "
+                             "or job time with acceleration and cornering (default: distance)")
+    parser.add_argument("--simplify-tolerance", type=float, default=0.05, help="furthest in mm simplify may move a line (default: 0.05)")
+    parser.add_argument("--arc-tolerance", type=float, default=0.05, help="furthest in mm a fitted arc may stray from its lines (default: 0.05)")
+    parser.add_argument("--tab-distance", type=float, default=15.0, help="distance between tabs in mm (default: 15)")
+    parser.add_argument("--tab-width", type=float, default=0.5, help="tab width in mm (default: 0.5)")
+    parser.add_argument("--polylines", action="store_true", help="save connected lines as LWPOLYLINE entities")
+    parser.add_argument("--gcode", action="store_true", help="save G-code using the 4ground layer colours rather than DXF files")
+    parser.add_argument("--cache-dir", default=DEFAULT_DIRECTORY, help="directory to cache analysis results in (default: {})".format(DEFAULT_DIRECTORY))
+    parser.add_argument("--no-cache", action="store_true", help="always recompute analysis results")
+    parser.add_argument("--idle-speed", type=float, default=100, help="tool idle speed for estimates (default: 100)")
+    parser.add_argument("--active-speed", type=float, default=35, help="tool active speed for estimates (default: 35)")
+    parser.add_argument("--acceleration", type=float, default=500, help="tool acceleration for estimates (default: 500)")
+    parser.add_argument("--junction-deviation", type=float, default=0.01, help="controller junction deviation in mm for estimates (default: 0.01)")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    options = parse_args(argv)
+
+    filenames = sorted(name for name in os.listdir(options.source) if name.lower().endswith(".dxf"))
+    if not filenames:
+        print("No DXF files found in {}".format(options.source), file=sys.stderr)
+        return 1
+
+    os.makedirs(options.destination, exist_ok=True)
+
+    failures = 0
+    with ProcessPoolExecutor(options.workers) as pool:
+        jobs = {
+            pool.submit(process_file,
+                        os.path.join(options.source, name),
+                        os.path.join(options.destination, name),
+                        options): name
+            for name in filenames
+        }
+
+        for job in as_completed(jobs):
+            name = jobs[job]
+            try:
+                messages = job.result()
+            except Exception as e:
+                failures += 1
+                print("{}: failed: {}".format(name, e), file=sys.stderr)
+                continue
+
+            for message in messages:
+                print("{}: {}".format(name, message))
+
+    print("Processed {} of {} files".format(len(filenames) - failures, len(filenames)))
+
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
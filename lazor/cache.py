@@ -0,0 +1,168 @@
+import hashlib
+import logging
+import os
+import pickle
+import tempfile
+from contextlib import suppress
+
+from lazor.datastructures import LineArray
+
+VERSION = 3
+DEFAULT_DIRECTORY = os.environ.get("LAZOR_CACHE", os.path.join(os.path.expanduser("~"), ".cache", "lazor"))
+DEFAULT_MAX_SIZE = 256 * 1024 * 1024
+EVICT_INTERVAL = 100
+
+log = logging.getLogger(__name__)
+
+
+class ResultCache:
+    """
+    An on-disk cache of analysis results keyed by a hash of the stage, its
+    parameters and the input geometry. Entries are evicted least recently
+    used first, by file modification time, once the cache grows past
+    `max_size` bytes. The size is tracked as entries are stored and only
+    rescanned from disk when it goes over, or every EVICT_INTERVAL stores
+    to catch entries written by other processes. If the directory can't be
+    created, read or written, the error is logged and results are computed
+    without the cache from then on.
+    """
+
+    def __init__(self, directory=DEFAULT_DIRECTORY, max_size=DEFAULT_MAX_SIZE):
+        self.directory = directory
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self.size = None
+        self.stores = 0
+        self.error = None
+
+        try:
+            os.makedirs(directory, exist_ok=True)
+        except OSError as e:
+            self.disable(e)
+
+    def disable(self, error):
+        log.warning("Not caching results in %s: %s", self.directory, error)
+        self.error = error
+
+    def key(self, stage, layer, params):
+        digest = hashlib.sha256()
+        digest.update("{}:{}:{}:{}".format(VERSION, stage, sorted(params.items()), type(layer).__name__).encode("utf-8"))
+        lines = LineArray.from_lines(layer)
+        digest.update(lines.coords.tobytes())
+        if lines.bulges is not None:
+            digest.update(lines.bulges.tobytes())
+        return digest.hexdigest()
+
+    def path(self, key):
+        return os.path.join(self.directory, key + ".pickle")
+
+    def load(self, key):
+        path = self.path(key)
+        try:
+            with open(path, "rb") as f:
+                value = pickle.load(f)
+        except FileNotFoundError:
+            return False, None
+        except (pickle.UnpicklingError, EOFError, AttributeError, ImportError):
+            with suppress(OSError):
+                os.remove(path)
+            return False, None
+        except OSError as e:
+            self.disable(e)
+            return False, None
+
+        with suppress(OSError):
+            os.utime(path)
+        return True, value
+
+    def store(self, key, value):
+        temporary = None
+        try:
+            descriptor, temporary = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+            with os.fdopen(descriptor, "wb") as f:
+                pickle.dump(value, f, pickle.HIGHEST_PROTOCOL)
+                stored = f.tell()
+            os.replace(temporary, self.path(key))
+        except OSError as e:
+            if temporary is not None:
+                with suppress(OSError):
+                    os.remove(temporary)
+            self.disable(e)
+            return
+
+        self.stores += 1
+        if self.size is not None:
+            self.size += stored
+        if self.size is None or self.size > self.max_size or self.stores % EVICT_INTERVAL == 0:
+            try:
+                self.evict()
+            except OSError as e:
+                self.disable(e)
+
+    def evict(self):
+        entries = []
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith(".pickle"):
+                stat = entry.stat()
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+
+        size = sum(entry[1] for entry in entries)
+        for _, entry_size, path in sorted(entries):
+            if size <= self.max_size:
+                break
+            with suppress(FileNotFoundError):
+                os.remove(path)
+            size -= entry_size
+
+        self.size = size
+
+    def run(self, function, layer, **params):
+        if self.error is not None:
+            return function(layer, **params)
+
+        key = self.key(function.__name__, layer, params)
+
+        found, value = self.load(key)
+        if found:
+            self.hits += 1
+            return value
+
+        self.misses += 1
+        value = function(layer, **params)
+        self.store(key, value)
+        return value
+
+    def reset_counts(self):
+        self.hits = 0
+        self.misses = 0
+
+    def describe(self):
+        if self.error is not None:
+            return "cache unavailable"
+        return "{} cache hit{}, {} miss{}".format(
+            self.hits, "" if self.hits == 1 else "s",
+            self.misses, "" if self.misses == 1 else "es"
+        )
+
+
+class NoCache(ResultCache):
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+
+    def run(self, function, layer, **params):
+        return function(layer, **params)
+
+    def describe(self):
+        return "cache disabled"
+
+
+_default_cache = None
+
+
+def default_cache():
+    global _default_cache
+    if _default_cache is None:
+        _default_cache = ResultCache()
+    return _default_cache
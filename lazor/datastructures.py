@@ -1,121 +1,198 @@
+import heapq
 import math
+from collections import defaultdict
 from enum import Enum
+from operator import itemgetter
 
-from typing import Set, Tuple, List
+import numpy as np
+from typing import Set, Tuple, List, Dict, Optional
 
 
-class Vec2:
+class Vec2(tuple):
+    """
+    An immutable 2D point or vector. Instances are hashed and compared by
+    value and used as set members and dict keys throughout, so they are
+    tuples of their coordinates, which keeps construction, hashing and
+    comparison in C.
+    """
+
+    __slots__ = ()
+
     x: float
     y: float
 
-    def __init__(self, x, y, *extra_dimensions):
-        self.x = float(x)
-        self.y = float(y)
+    def __new__(cls, x, y, *extra_dimensions):
+        return _new_tuple(cls, (float(x), float(y)))
+
+    x = property(itemgetter(0))
+    y = property(itemgetter(1))
+
+    def __reduce__(self):
+        return Vec2, tuple(self)
 
     def __add__(self, other):
-        assert isinstance(other, Vec2)
-        return Vec2(self.x + other.x, self.y + other.y)
+        return _new_tuple(Vec2, (self[0] + other[0], self[1] + other[1]))
 
     def __sub__(self, other):
-        assert isinstance(other, Vec2)
-        return Vec2(self.x - other.x, self.y - other.y)
+        return _new_tuple(Vec2, (self[0] - other[0], self[1] - other[1]))
 
     def normalized(self):
-        if self.length() == 0:
+        length = self.length()
+        if length == 0:
             return Vec2(0, 0)
-        return Vec2(self.x / self.length(), self.y / self.length())
+        return _new_tuple(Vec2, (self[0] / length, self[1] / length))
 
     def __mul__(self, other):
-        assert isinstance(other, (int, float))
-        return Vec2(self.x * other, self.y * other)
+        return _new_tuple(Vec2, (self[0] * other, self[1] * other))
+
+    __rmul__ = __mul__
 
     def __truediv__(self, other):
-        assert isinstance(other, (int, float))
-        return Vec2(self.x / other, self.y / other)
+        return _new_tuple(Vec2, (self[0] / other, self[1] / other))
 
     def length(self):
-        return math.sqrt(self.x ** 2 + self.y ** 2)
+        return math.hypot(self[0], self[1])
 
     def distance(self, other):
-        assert isinstance(other, Vec2)
-        line = self - other
-        return line.length()
+        return math.hypot(self[0] - other[0], self[1] - other[1])
 
-    def __iter__(self):
-        return iter((self.x, self.y))
+    def midpoint(self, other):
+        return _new_tuple(Vec2, ((self[0] + other[0]) / 2, (self[1] + other[1]) / 2))
 
-    def __getitem__(self, item):
-        if item == 0:
-            return self.x
-        elif item == 1:
-            return self.y
-        else:
-            raise IndexError()
+    def cross(self, other):
+        return self[0] * other[1] - self[1] * other[0]
 
-    def __setitem__(self, item, value):
-        if item == 0:
-            self.x = value
-        elif item == 1:
-            self.y = value
-        else:
-            raise IndexError()
+    def __repr__(self):
+        return "<Vec2 ({}, {})>".format(self[0], self[1])
 
-    def midpoint(self, other):
-        return Vec2((self.x + other.x) / 2, (self.y + other.y) / 2)
+    def dot(self, other):
+        return self[0] * other[0] + self[1] * other[1]
 
-    def __hash__(self):
-        return hash((self.x, self.y))
 
-    def cross(self, other):
-        return self.x * other.y - self.y * other.x
+# Arithmetic on floats already gives floats, so results skip Vec2.__new__.
+_new_tuple = tuple.__new__
 
-    def __eq__(self, other):
-        return self.x == other.x and self.y == other.y
 
-    def __repr__(self):
-        return "<Vec2 ({}, {})>".format(self.x, self.y)
+class Orientation(Enum):
+    COLINEAR = 0
+    CLOCKWISE = 1
+    COUNTERCLOCKWISE = 2
+
+
+def orientation(p, q, r) -> Orientation:
+    val = (q.y - p.y) * (r.x - q.x) - (q.x - p.x) * (r.y - q.y)
+    if val == 0:
+        return Orientation.COLINEAR
+
+    return Orientation.CLOCKWISE if val > 0 else Orientation.COUNTERCLOCKWISE
 
-    def dot(self, other):
-        return self.x * other.x + self.y * other.y
+
+def on_segment(p, q, r):
+    return min(p.x, r.x) <= q.x <= max(p.x, r.x) and min(p.y, r.y) <= q.y <= max(p.y, r.y)
+
+
+def orientations(p, q, r):
+    """
+    The vectorised form of `orientation` over arrays of points, giving 0 for
+    colinear, 1 for clockwise and -1 for counterclockwise.
+    """
+
+    return np.sign((q[..., 1] - p[..., 1]) * (r[..., 0] - q[..., 0]) - (q[..., 0] - p[..., 0]) * (r[..., 1] - q[..., 1]))
+
+
+def on_segments(p, q, r):
+    return (np.minimum(p[..., 0], r[..., 0]) <= q[..., 0]) & (q[..., 0] <= np.maximum(p[..., 0], r[..., 0])) & \
+           (np.minimum(p[..., 1], r[..., 1]) <= q[..., 1]) & (q[..., 1] <= np.maximum(p[..., 1], r[..., 1]))
+
+
+def segments_intersect(first, second):
+    """
+    The vectorised form of `Line.intersect` over broadcastable arrays of
+    segments shaped (..., 2, 2), including touching and colinear overlapping
+    segments.
+    """
+
+    p1, q1 = first[..., 0, :], first[..., 1, :]
+    p2, q2 = second[..., 0, :], second[..., 1, :]
+
+    o1 = orientations(p1, q1, p2)
+    o2 = orientations(p1, q1, q2)
+    o3 = orientations(p2, q2, p1)
+    o4 = orientations(p2, q2, q1)
+
+    return ((o1 != o2) & (o3 != o4)) | \
+        ((o1 == 0) & on_segments(p1, p2, q1)) | \
+        ((o2 == 0) & on_segments(p1, q2, q1)) | \
+        ((o3 == 0) & on_segments(p2, p1, q2)) | \
+        ((o4 == 0) & on_segments(p2, q1, q2))
 
 
 class Line:
+    """
+    An immutable line segment. The vector from start to end, its length,
+    direction and hash are cached as they are needed repeatedly while
+    lines sit in sets and dicts during analysis. Slots are filled through
+    their descriptors so that construction doesn't go through the
+    `__setattr__` that keeps them read-only.
+    """
+
+    __slots__ = ("start", "end", "_line", "_length", "_direction", "_hash")
+
     start: Vec2
     end: Vec2
-    line: Vec2
 
-    def __init__(self, start: Vec2, end: Vec2):
-        self.start = start
-        self.end = end
-        self.line = end - start
+    # Straight lines are arcs with no bulge, so they compare equal to arcs
+    # only when the arc is flat too.
+    bulge = 0.0
+
+    def __new__(cls, start: Vec2, end: Vec2):
+        self = object.__new__(cls)
+        _set_start(self, start)
+        _set_end(self, end)
+        _set_line(self, None)
+        _set_length(self, None)
+        _set_direction(self, None)
+        _set_hash(self, None)
+        return self
+
+    def __setattr__(self, name, value):
+        raise AttributeError("{} is immutable".format(type(self).__name__))
+
+    def __delattr__(self, name):
+        raise AttributeError("{} is immutable".format(type(self).__name__))
+
+    def __reduce__(self):
+        return Line, (self.start, self.end)
+
+    @property
+    def line(self) -> Vec2:
+        line = self._line
+        if line is None:
+            line = self.end - self.start
+            _set_line(self, line)
+        return line
 
     def length(self):
-        return self.line.length()
+        length = self._length
+        if length is None:
+            length = self.line.length()
+            _set_length(self, length)
+        return length
 
     def normalized(self):
-        return self.line.normalized()
+        direction = self._direction
+        if direction is None:
+            direction = self.line.normalized()
+            _set_direction(self, direction)
+        return direction
 
     def midpoint(self):
         return Vec2((self.start.x + self.end.x) / 2, (self.start.y + self.end.y) / 2)
 
-    def intersect(self, other):
-        def on_segment(p, q, r):
-            if q.x <= max(p.x, r.x) and q.x >= min(p.x, r.x) and q.y <= max(p.y, r.y) and q.y >= min(p.y, r.y):
-                return True
-            return False
-
-        class Orientation(Enum):
-            COLINEAR = 0
-            CLOCKWISE = 1
-            COUNTERCLOCKWISE = 2
-
-        def orientation(p, q, r) -> Orientation:
-            val = (q.y - p.y) * (r.x - q.x) - (q.x - p.x) * (r.y - q.y)
-            if val == 0:
-                return Orientation.COLINEAR
-
-            return Orientation.CLOCKWISE if val > 0 else Orientation.COUNTERCLOCKWISE
+    def reversed(self):
+        return Line(self.end, self.start)
 
+    def intersect(self, other):
         p1 = self.start
         q1 = self.end
         p2 = other.start
@@ -129,13 +206,13 @@ class Line:
         if o1 != o2 and o3 != o4:
             return True
 
-        if o1 == 0 and on_segment(p1, p2, q1):
+        if o1 == Orientation.COLINEAR and on_segment(p1, p2, q1):
             return True
-        if o2 == 0 and on_segment(p1, q2, q1):
+        if o2 == Orientation.COLINEAR and on_segment(p1, q2, q1):
             return True
-        if o3 == 0 and on_segment(p2, p1, q2):
+        if o3 == Orientation.COLINEAR and on_segment(p2, p1, q2):
             return True
-        if o4 == 0 and on_segment(p2, q1, q2):
+        if o4 == Orientation.COLINEAR and on_segment(p2, q1, q2):
             return True
 
         return False
@@ -147,12 +224,16 @@ class Line:
         return iter((self.start, self.end))
 
     def __eq__(self, other):
-        ts, te = self
-        os, oe = other
-        return (ts == os and te == oe) or (ts == oe and te == os)
+        ts, te, os, oe = self.start, self.end, other.start, other.end
+        bulge = other.bulge
+        return (ts == os and te == oe and self.bulge == bulge) or (ts == oe and te == os and self.bulge == -bulge)
 
     def __hash__(self):
-        return hash(frozenset(self))
+        result = self._hash
+        if result is None:
+            result = hash(frozenset((self.start, self.end)))
+            _set_hash(self, result)
+        return result
 
     def split(self, n):
         verts = [self.start]
@@ -190,6 +271,71 @@ class Line:
         return remaining, [part_a] + parts
 
 
+class Arc(Line):
+    """
+    A circular arc from start to end, described as in DXF polylines by its
+    bulge, the tangent of a quarter of the angle it sweeps. A positive bulge
+    turns anticlockwise from start to end, a negative bulge clockwise.
+    Everything that doesn't know about arcs treats one as its chord.
+    """
+
+    __slots__ = ("bulge",)
+
+    bulge: float
+
+    def __new__(cls, start: Vec2, end: Vec2, bulge: float):
+        self = Line.__new__(cls, start, end)
+        _set_bulge(self, float(bulge))
+        return self
+
+    def __reduce__(self):
+        return Arc, (self.start, self.end, self.bulge)
+
+    def angle(self):
+        return 4 * math.atan(self.bulge)
+
+    def radius(self):
+        return self.line.length() * (1 + self.bulge * self.bulge) / (4 * abs(self.bulge))
+
+    def centre(self):
+        offset = (1 - self.bulge * self.bulge) / (4 * self.bulge)
+        return Vec2(
+            (self.start.x + self.end.x) / 2 - self.line.y * offset,
+            (self.start.y + self.end.y) / 2 + self.line.x * offset
+        )
+
+    def length(self):
+        return self.radius() * abs(self.angle())
+
+    def reversed(self):
+        return Arc(self.end, self.start, -self.bulge)
+
+    def add_tab(self, after, tab_length=1):
+        return after - self.length(), [self]
+
+    def points(self, steps):
+        """
+        `steps + 1` points evenly spaced along the arc, from start to end.
+        """
+
+        centre = self.centre()
+        radius = self.radius()
+        start = math.atan2(self.start.y - centre.y, self.start.x - centre.x)
+        sweep = self.angle()
+
+        return [self.start] + [
+            Vec2(centre.x + radius * math.cos(start + sweep * n / steps), centre.y + radius * math.sin(start + sweep * n / steps))
+            for n in range(1, steps)
+        ] + [self.end]
+
+    def __repr__(self):
+        return "<Arc ({}, {}, {})>".format(self.start, self.end, self.bulge)
+
+
+_set_start, _set_end, _set_line, _set_length, _set_direction, _set_hash = (Line.__dict__[name].__set__ for name in Line.__slots__)
+_set_bulge = Arc.bulge.__set__
+
+
 class Rect:
     min: Vec2
     max: Vec2
@@ -202,39 +348,272 @@ class Rect:
         return self.min.x <= point.x <= self.max.x and self.min.y <= point.y <= self.max.y
 
 
+class LineArray:
+    """
+    A layer of lines stored as an (N, 2, 2) float64 array, where
+    `coords[n, 0]` is the start and `coords[n, 1]` the end of line `n`.
+    Iterating or indexing yields `Line` objects so a LineArray can be used
+    wherever a list of lines is expected. Layers holding arcs also keep an
+    array of bulges, zero for straight lines, and yield `Arc` objects for
+    the rest.
+    """
+
+    coords: np.ndarray
+    bulges: Optional[np.ndarray]
+
+    def __init__(self, coords, bulges=None):
+        self.coords = np.asarray(coords, dtype=np.float64).reshape(-1, 2, 2)
+        if bulges is not None:
+            bulges = np.asarray(bulges, dtype=np.float64).reshape(-1)
+            if not bulges.any():
+                bulges = None
+        self.bulges = bulges
+
+    @classmethod
+    def from_lines(cls, lines):
+        if isinstance(lines, LineArray):
+            return lines
+        if not isinstance(lines, list):
+            lines = list(lines)
+
+        coords = np.fromiter((c for line in lines for vert in line for c in vert), dtype=np.float64)
+        bulges = None
+        if any(isinstance(line, Arc) for line in lines):
+            bulges = [line.bulge if isinstance(line, Arc) else 0.0 for line in lines]
+        return cls(coords, bulges)
+
+    def to_lines(self):
+        return list(self)
+
+    @property
+    def starts(self):
+        return self.coords[:, 0]
+
+    @property
+    def ends(self):
+        return self.coords[:, 1]
+
+    def lengths(self):
+        line = self.ends - self.starts
+        lengths = np.hypot(line[:, 0], line[:, 1])
+        if self.bulges is not None:
+            bulges = self.bulges
+            arcs = bulges != 0
+            radii = lengths[arcs] * (1 + bulges[arcs] ** 2) / (4 * np.abs(bulges[arcs]))
+            lengths[arcs] = radii * np.abs(4 * np.arctan(bulges[arcs]))
+        return lengths
+
+    def centres(self):
+        """
+        The centre of each arc as an (N, 2) array, with the midpoint of
+        each straight line in its place.
+        """
+
+        centres = (self.starts + self.ends) / 2
+        if self.bulges is not None:
+            arcs = self.bulges != 0
+            bulges = self.bulges[arcs]
+            chords = self.ends[arcs] - self.starts[arcs]
+            offsets = (1 - bulges ** 2) / (4 * bulges)
+            centres[arcs] += np.column_stack([-chords[:, 1], chords[:, 0]]) * offsets[:, None]
+        return centres
+
+    def tangents(self):
+        """
+        The unit direction each line leaves its start and arrives at its end
+        in, as two (N, 2) arrays. Zero length lines have no direction and
+        give zero vectors.
+        """
+
+        chords = self.ends - self.starts
+        lengths = np.hypot(chords[:, 0], chords[:, 1])
+        directions = np.divide(chords, lengths[:, None], out=np.zeros_like(chords), where=lengths[:, None] > 0)
+        if self.bulges is None:
+            return directions, directions
+
+        starts, ends = directions.copy(), directions.copy()
+        arcs = self.bulges != 0
+        turns = np.sign(self.bulges[arcs])[:, None]
+        centres = self.centres()[arcs]
+        for tangents, points in ((starts, self.starts[arcs]), (ends, self.ends[arcs])):
+            radii = points - centres
+            tangents[arcs] = np.column_stack([-radii[:, 1], radii[:, 0]]) * turns / np.hypot(radii[:, 0], radii[:, 1])[:, None]
+        return starts, ends
+
+    def travel_lengths(self):
+        """
+        The length of each idle move between the end of one line and the
+        start of the next, in layer order.
+        """
+
+        travel = self.starts[1:] - self.ends[:-1]
+        return np.hypot(travel[:, 0], travel[:, 1])
+
+    def runs(self):
+        """
+        Splits the lines, in order, into runs where each line starts exactly
+        where the previous one ended.
+        """
+
+        if not len(self):
+            return []
+
+        coords = self.coords
+        breaks = np.flatnonzero((coords[1:, 0] != coords[:-1, 1]).any(axis=1)) + 1
+        bounds = [0] + breaks.tolist() + [len(self)]
+        return [self[first:last] for first, last in zip(bounds, bounds[1:])]
+
+    def bounds(self):
+        points = self.coords.reshape(-1, 2)
+        return Rect(Vec2(*points.min(axis=0)), Vec2(*points.max(axis=0)))
+
+    def translated(self, offset: Vec2):
+        return LineArray(self.coords - (offset.x, offset.y), self.bulges)
+
+    def boxes(self):
+        """
+        The bounding box of each line as an (N, 4) array of min x, min y,
+        max x and max y.
+        """
+
+        return np.concatenate([self.coords.min(axis=1), self.coords.max(axis=1)], axis=1)
+
+    def intersects(self, line: Line):
+        """
+        Whether each line touches or crosses `line`, as a boolean array.
+        """
+
+        (sx, sy), (ex, ey) = line
+        boxes = self.boxes()
+        candidates = np.flatnonzero((boxes[:, 0] <= max(sx, ex)) & (boxes[:, 2] >= min(sx, ex)) &
+                                    (boxes[:, 1] <= max(sy, ey)) & (boxes[:, 3] >= min(sy, ey)))
+
+        result = np.zeros(len(self), dtype=bool)
+        result[candidates] = segments_intersect(self.coords[candidates], np.array(((sx, sy), (ex, ey))))
+        return result
+
+    def intersecting_pairs(self, other=None, chunk_size=1 << 20):
+        """
+        The index pairs `(i, j)` of lines in this array that touch or cross
+        lines in `other`, as two arrays. Without `other` the lines are tested
+        against each other, reporting each pair once with `i < j`.
+        """
+
+        boxes = self.boxes()
+        other_boxes = boxes if other is None else other.boxes()
+        other_coords = self.coords if other is None else other.coords
+
+        firsts, seconds = [], []
+        step = max(1, chunk_size // max(1, len(other_boxes)))
+        for chunk in range(0, len(boxes), step):
+            box = boxes[chunk:chunk + step, None]
+            overlap = (box[..., 0] <= other_boxes[:, 2]) & (box[..., 2] >= other_boxes[:, 0]) & \
+                      (box[..., 1] <= other_boxes[:, 3]) & (box[..., 3] >= other_boxes[:, 1])
+            if other is None:
+                overlap &= np.arange(chunk, chunk + len(box))[:, None] < np.arange(len(other_boxes))
+            i, j = np.nonzero(overlap)
+            i += chunk
+
+            hits = segments_intersect(self.coords[i], other_coords[j])
+            firsts.append(i[hits])
+            seconds.append(j[hits])
+
+        if not firsts:
+            return np.empty(0, dtype=np.intp), np.empty(0, dtype=np.intp)
+        return np.concatenate(firsts), np.concatenate(seconds)
+
+    def __len__(self):
+        return len(self.coords)
+
+    def __iter__(self):
+        if self.bulges is None:
+            for (sx, sy), (ex, ey) in self.coords.tolist():
+                yield Line(Vec2(sx, sy), Vec2(ex, ey))
+            return
+
+        for ((sx, sy), (ex, ey)), bulge in zip(self.coords.tolist(), self.bulges.tolist()):
+            if bulge:
+                yield Arc(Vec2(sx, sy), Vec2(ex, ey), bulge)
+            else:
+                yield Line(Vec2(sx, sy), Vec2(ex, ey))
+
+    def __getitem__(self, n):
+        if isinstance(n, slice):
+            return LineArray(self.coords[n], None if self.bulges is None else self.bulges[n])
+        (sx, sy), (ex, ey) = self.coords[n].tolist()
+        if self.bulges is not None and self.bulges[n]:
+            return Arc(Vec2(sx, sy), Vec2(ex, ey), self.bulges[n])
+        return Line(Vec2(sx, sy), Vec2(ex, ey))
+
+    def __repr__(self):
+        return "<LineArray ({} lines)>".format(len(self))
+
+
 class Polygon:
     loops: Set[Tuple[Vec2]]
     points: Set[Vec2]
     lines: Set[Line]
+    edges: LineArray
 
     def __init__(self, *loops):
         self.loops = {tuple(loop) for loop in loops}
         self.points = set()
         self.lines = set()
+        edges = []
         for loop in loops:
             for n in range(len(loop)):
                 start = loop[n]
                 self.points.add(start)
                 end = loop[(n + 1) % len(loop)]
                 self.lines.add(Line(start, end))
+                edges.append((start.x, start.y, end.x, end.y))
+
+        self.edges = LineArray(edges)
+        self._box = None
 
     def bounding_box(self):
-        return Rect(Vec2(min([p.x for p in self.points]), min([p.y for p in self.points])),
-                    Vec2(max([p.x for p in self.points]), max([p.y for p in self.points])))
+        if self._box is None:
+            self._box = Rect(Vec2(min([p.x for p in self.points]), min([p.y for p in self.points])),
+                             Vec2(max([p.x for p in self.points]), max([p.y for p in self.points])))
+        return self._box
 
     def inside(self, point: Vec2):
+        return bool(self.inside_many([point])[0])
+
+    def inside_many(self, points, chunk_size=1 << 20):
+        """
+        Tests many points at once, returning a boolean array. Each point casts
+        a ray towards -x and counts the edges it crosses, an edge counting
+        when it straddles the point's y half-open, so a vertex shared by two
+        edges is only counted once.
+        """
+
+        if isinstance(points, np.ndarray):
+            points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+        else:
+            points = np.fromiter((c for point in points for c in point), dtype=np.float64).reshape(-1, 2)
+
         box = self.bounding_box()
-        if not box.inside(point):
-            return False
+        result = (points[:, 0] >= box.min.x) & (points[:, 0] <= box.max.x) & \
+                 (points[:, 1] >= box.min.y) & (points[:, 1] <= box.max.y)
+
+        x1, y1, x2, y2 = self.edges.coords.reshape(-1, 4).T
+        dy = y2 - y1
+        slope = np.divide(x2 - x1, dy, out=np.zeros_like(dy), where=dy != 0)
+
+        candidates = np.flatnonzero(result)
+        step = max(1, chunk_size // max(1, len(self.edges)))
+        for chunk in range(0, len(candidates), step):
+            indices = candidates[chunk:chunk + step]
+            px = points[indices, 0, None]
+            py = points[indices, 1, None]
 
-        crossings = 0
-        check_line = Line(Vec2(box.min.x - 1, point.y), Vec2(point.x, point.y))
+            straddles = (y1 > py) != (y2 > py)
+            crossings = straddles & (x1 + (py - y1) * slope < px)
 
-        for line in self.lines:
-            if line.intersect(check_line):
-                crossings += 1
+            result[indices] = crossings.sum(axis=1) % 2 == 1
 
-        return crossings > 0 and crossings % 2 == 1
+        return result
 
 
 class LineSet:
@@ -276,3 +655,244 @@ class LineSet:
 
     def __len__(self):
         return len(self.lines)
+
+    @classmethod
+    def from_lines(cls, lines, loop=False):
+        """
+        Builds a LineSet from lines already known to be connected and
+        distinct, skipping the per-line checks performed by `add`.
+        """
+
+        line_set = cls.__new__(cls)
+        line_set.lines = list(lines)
+        line_set.verts = {vert for line in line_set.lines for vert in line}
+        line_set.loop = loop
+        return line_set
+
+
+class SpatialHash:
+    cell_size: float
+    cells: Dict[Tuple[int, int], List[Tuple[Vec2, object]]]
+
+    def __init__(self, cell_size):
+        self.cell_size = cell_size
+        self.cells = defaultdict(list)
+
+    def cell(self, point):
+        return math.floor(point.x / self.cell_size), math.floor(point.y / self.cell_size)
+
+    def add(self, point, value):
+        self.cells[self.cell(point)].append((point, value))
+
+    def near(self, point):
+        """
+        Yields every (point, value) pair stored in the cell containing `point`
+        and its eight neighbours. Anything closer than `cell_size` to `point`
+        is guaranteed to be among them, but so may be points further away.
+        """
+
+        cx, cy = self.cell(point)
+        for x in (cx - 1, cx, cx + 1):
+            for y in (cy - 1, cy, cy + 1):
+                cell = self.cells.get((x, y))
+                if cell:
+                    yield from cell
+
+
+class DisjointSet:
+    parents: Dict[object, object]
+    sizes: Dict[object, int]
+
+    def __init__(self):
+        self.parents = {}
+        self.sizes = {}
+
+    def find(self, item):
+        parents = self.parents
+        if item not in parents:
+            parents[item] = item
+            self.sizes[item] = 1
+            return item
+
+        while parents[item] != item:
+            parents[item] = parents[parents[item]]
+            item = parents[item]
+        return item
+
+    def union(self, a, b):
+        """
+        Merges the sets containing `a` and `b`, returning False if they were
+        already the same set.
+        """
+
+        a = self.find(a)
+        b = self.find(b)
+        if a == b:
+            return False
+
+        if self.sizes[a] < self.sizes[b]:
+            a, b = b, a
+        self.parents[b] = a
+        self.sizes[a] += self.sizes[b]
+        return True
+
+
+class KDTree:
+    """
+    A balanced 2d-tree over a fixed set of points, answering nearest point
+    queries while points are removed from it. Each node is stored implicitly
+    as the median of a range of `order`, alongside a count of the points
+    still alive beneath it so that exhausted subtrees are skipped.
+    """
+
+    small_range = 64
+
+    def __init__(self, points):
+        points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+        count = len(points)
+
+        order = np.arange(count)
+        small_ranges = []
+        stack = [(0, count, 0)]
+        while stack:
+            lo, hi, axis = stack.pop()
+            if hi - lo <= self.small_range:
+                small_ranges.append((lo, hi, axis))
+                continue
+
+            mid = (lo + hi) // 2
+            segment = order[lo:hi]
+            order[lo:hi] = segment[np.argpartition(points[segment, axis], mid - lo)]
+            stack.append((lo, mid, 1 - axis))
+            stack.append((mid + 1, hi, 1 - axis))
+
+        self.xs = points[:, 0].tolist()
+        self.ys = points[:, 1].tolist()
+        self.order = order.tolist()
+
+        coords = (self.xs, self.ys)
+        while small_ranges:
+            lo, hi, axis = small_ranges.pop()
+            if hi - lo <= 1:
+                continue
+            mid = (lo + hi) // 2
+            self.order[lo:hi] = sorted(self.order[lo:hi], key=coords[axis].__getitem__)
+            small_ranges.append((lo, mid, 1 - axis))
+            small_ranges.append((mid + 1, hi, 1 - axis))
+
+        self.position = [0] * count
+        for pos, index in enumerate(self.order):
+            self.position[index] = pos
+
+        self.alive = [0] * count
+        stack = [(0, count)]
+        while stack:
+            lo, hi = stack.pop()
+            if lo >= hi:
+                continue
+            mid = (lo + hi) // 2
+            self.alive[mid] = hi - lo
+            stack.append((lo, mid))
+            stack.append((mid + 1, hi))
+
+        self.removed = [False] * count
+
+    def __len__(self):
+        return self.alive[len(self.order) // 2] if self.order else 0
+
+    def remove(self, index):
+        if self.removed[index]:
+            return
+        self.removed[index] = True
+
+        pos = self.position[index]
+        lo, hi = 0, len(self.order)
+        while True:
+            mid = (lo + hi) // 2
+            self.alive[mid] -= 1
+            if pos == mid:
+                return
+            if pos < mid:
+                hi = mid
+            else:
+                lo = mid + 1
+
+    def nearest(self, x, y):
+        """
+        Returns the index of the remaining point closest to (x, y), preferring
+        the lowest index when several are equally close, or None if every
+        point has been removed.
+        """
+
+        xs, ys, order, alive, removed = self.xs, self.ys, self.order, self.alive, self.removed
+
+        best = None
+        best_distance = float("inf")
+        stack = [(0, len(order), 0, 0.0)]
+        while stack:
+            lo, hi, axis, bound = stack.pop()
+            if lo >= hi or bound > best_distance:
+                continue
+            mid = (lo + hi) // 2
+            if not alive[mid]:
+                continue
+
+            index = order[mid]
+            dx = xs[index] - x
+            dy = ys[index] - y
+            if not removed[index]:
+                distance = dx * dx + dy * dy
+                if distance < best_distance or (distance == best_distance and index < best):
+                    best = index
+                    best_distance = distance
+
+            diff = -dx if axis == 0 else -dy
+            if diff < 0:
+                stack.append((mid + 1, hi, 1 - axis, diff * diff))
+                stack.append((lo, mid, 1 - axis, bound))
+            else:
+                stack.append((lo, mid, 1 - axis, diff * diff))
+                stack.append((mid + 1, hi, 1 - axis, bound))
+
+        return best
+
+    def nearest_k(self, x, y, k):
+        """
+        Returns the indices of up to `k` remaining points closest to (x, y),
+        nearest first.
+        """
+
+        xs, ys, order, alive, removed = self.xs, self.ys, self.order, self.alive, self.removed
+
+        found = []
+        worst = float("inf")
+        stack = [(0, len(order), 0, 0.0)]
+        while stack:
+            lo, hi, axis, bound = stack.pop()
+            if lo >= hi or bound > worst:
+                continue
+            mid = (lo + hi) // 2
+            if not alive[mid]:
+                continue
+
+            index = order[mid]
+            dx = xs[index] - x
+            dy = ys[index] - y
+            if not removed[index]:
+                distance = dx * dx + dy * dy
+                if len(found) < k:
+                    heapq.heappush(found, (-distance, -index))
+                elif distance < -found[0][0]:
+                    heapq.heapreplace(found, (-distance, -index))
+                if len(found) == k:
+                    worst = -found[0][0]
+
+            diff = -dx if axis == 0 else -dy
+            if diff < 0:
+                stack.append((mid + 1, hi, 1 - axis, diff * diff))
+                stack.append((lo, mid, 1 - axis, bound))
+            else:
+                stack.append((lo, mid, 1 - axis, diff * diff))
+                stack.append((mid + 1, hi, 1 - axis, bound))
+
+        return [-index for _, index in sorted(found, reverse=True)]
@@ -1,28 +1,230 @@
+import io
+import math
+from array import array
+
 import ezdxf
+import numpy as np
 from collections import defaultdict
 
-from lazor.datastructures import Vec2, Line
+from lazor.datastructures import Vec2, LineArray
 
 
-def draw(layers, colours):
-    dxf = ezdxf.new("R2007")
+COLOURS_FOR_4GROUND = [
+    (1, "Cut"),
+    (30, "Cut (2nd pass)"),
+    (5, "Line"),
+    (6, "Etch"),
+    (17, "Score"),
+    (7, "Sprue")
+]
+
+
+def draw(layers, colours, polylines=False):
+    dxf = template(layers, colours)
     modelspace = dxf.modelspace()
 
-    for n, (layer, lines) in enumerate(layers.items()):
+    for layer, lines in layers.items():
+        lines = LineArray.from_lines(lines)
+        for chain in (lines.runs() if polylines else [lines]):
+            if polylines and len(chain) > 1:
+                vertices, bulges, closed = polyline_vertices(chain)
+                modelspace.add_lwpolyline(np.column_stack([vertices, bulges]).tolist(), format="xyb",
+                                          close=closed, dxfattribs={"layer": layer})
+                continue
+
+            arcs = arc_parameters(chain)
+            for (start, end), arc in zip(chain.coords.tolist(), arcs):
+                if arc is None:
+                    modelspace.add_line(start, end, dxfattribs={"layer": layer})
+                else:
+                    modelspace.add_arc(*arc, dxfattribs={"layer": layer})
+
+    return dxf
+
+
+def arc_parameters(lines):
+    """
+    The centre, radius, start and end angle in degrees of every arc in a
+    LineArray, as DXF ARC entities describe them, with None for straight
+    lines. DXF arcs always run anticlockwise, so clockwise arcs swap their
+    angles.
+    """
+
+    if lines.bulges is None:
+        return [None] * len(lines)
+
+    bulges = lines.bulges
+    arcs = bulges != 0
+    starts, ends = lines.starts[arcs], lines.ends[arcs]
+    centres = lines.centres()[arcs]
+    radii = np.hypot(*(starts - centres).T)
+    start_angles = np.degrees(np.arctan2(*(starts - centres).T[::-1]))
+    end_angles = np.degrees(np.arctan2(*(ends - centres).T[::-1]))
+    clockwise = bulges[arcs] < 0
+    start_angles[clockwise], end_angles[clockwise] = end_angles[clockwise], start_angles[clockwise]
+
+    parameters = [None] * len(lines)
+    for n, centre, radius, start, end in zip(np.flatnonzero(arcs).tolist(), centres.tolist(), radii.tolist(),
+                                             start_angles.tolist(), end_angles.tolist()):
+        parameters[n] = (centre, radius, start, end)
+    return parameters
+
+
+def polyline_vertices(chain):
+    """
+    The vertices of a run of lines as a polyline, the bulge of the line
+    leaving each vertex, and whether the run is closed.
+    """
+
+    coords = chain.coords
+    bulges = np.zeros(len(chain)) if chain.bulges is None else chain.bulges
+    closed = polyline_closes(bulges, True) and bool((coords[-1, 1] == coords[0, 0]).all())
+    if closed:
+        return coords[:, 0], bulges, True
+    return np.concatenate([coords[:, 0], coords[-1:, 1]]), np.append(bulges, 0.0), False
+
+
+def polyline_closes(bulges, closed):
+    """
+    Whether a polyline with the given vertex bulges has a closing segment.
+    A closed two vertex polyline only has one if it is curved, such as a
+    whole circle, as a straight one would retrace its first segment.
+    """
+
+    return bool(closed) and (len(bulges) > 2 or (len(bulges) == 2 and any(bulges)))
+
+
+def polyline_coords(points, closes):
+    points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+    if closes:
+        points = np.concatenate([points, points[:1]])
+    return np.stack([points[:-1], points[1:]], axis=1)
+
+
+def polyline_bulges(bulges, closes):
+    bulges = np.asarray(bulges, dtype=np.float64)
+    if closes:
+        return bulges
+    return bulges[:-1]
+
+
+def arc_coords(centre, radius, start_angle, end_angle, flipped=False):
+    """
+    The coordinates and bulges of a DXF ARC, or a CIRCLE given as a whole
+    turn, as lines. Whole circles become two half circle arcs, as a single
+    bulge can't describe them. `flipped` mirrors the arc for entities
+    extruded along -z.
+    """
+
+    sweep = (end_angle - start_angle) % 360 or 360
+    angles = np.radians([start_angle, start_angle + sweep / 2, start_angle + sweep] if sweep == 360 else [start_angle, start_angle + sweep])
+    points = np.column_stack([centre[0] + radius * np.cos(angles), centre[1] + radius * np.sin(angles)])
+    bulge = math.tan(math.radians(sweep / (len(points) - 1)) / 4)
+
+    if flipped:
+        points[:, 0] = -points[:, 0]
+        bulge = -bulge
+
+    return np.stack([points[:-1], points[1:]], axis=1), np.full(len(points) - 1, bulge)
+
+
+def template(layers, colours):
+    dxf = ezdxf.new("R2007")
+
+    for layer in layers:
         dxf.layers.new(layer, dxfattribs={"color": colours[layer]})
-        for line in lines:
-            modelspace.add_line(*line, dxfattribs={"layer": layer})
 
     return dxf
 
 
+LINE_ENTITY = "  0\nLINE\n  5\n{:X}\n330\n{}\n100\nAcDbEntity\n  8\n{}\n100\nAcDbLine\n" \
+              " 10\n{!r}\n 20\n{!r}\n 30\n0.0\n 11\n{!r}\n 21\n{!r}\n 31\n0.0\n"
+ARC_ENTITY = "  0\nARC\n  5\n{:X}\n330\n{}\n100\nAcDbEntity\n  8\n{}\n100\nAcDbCircle\n" \
+             " 10\n{!r}\n 20\n{!r}\n 30\n0.0\n 40\n{!r}\n100\nAcDbArc\n 50\n{!r}\n 51\n{!r}\n"
+LWPOLYLINE_ENTITY = "  0\nLWPOLYLINE\n  5\n{:X}\n330\n{}\n100\nAcDbEntity\n  8\n{}\n100\nAcDbPolyline\n" \
+                    " 90\n{}\n 70\n{}\n"
+VERTEX = " 10\n{!r}\n 20\n{!r}\n"
+BULGE = " 42\n{!r}\n"
+ENTITIES_SECTION = "  0\nSECTION\n  2\nENTITIES\n"
+HANDSEED = "$HANDSEED\n  5\n"
+
+
+def write(filename, layers, colours, polylines=False, chunk_size=10000):
+    """
+    Saves layers to a DXF file with the same structure as `draw(...).saveas`,
+    but streams the entities into the ENTITIES section of an otherwise empty
+    ezdxf document rather than adding each one to the document.
+    """
+
+    dxf = template(layers, colours)
+    owner = dxf.modelspace().layout_key
+
+    buffer = io.StringIO()
+    dxf.write(buffer)
+    text = buffer.getvalue()
+
+    seed_start = text.index(HANDSEED) + len(HANDSEED)
+    seed_end = text.index("\n", seed_start)
+    handle = int(text[seed_start:seed_end], 16)
+
+    layers = {name: LineArray.from_lines(lines) for name, lines in layers.items()}
+    if polylines:
+        layers = {name: lines.runs() for name, lines in layers.items()}
+    total = sum(len(lines) for lines in layers.values())
+
+    entities = text.index(ENTITIES_SECTION) + len(ENTITIES_SECTION)
+
+    with open(filename, "wt", encoding="utf-8") as f:
+        f.write(text[:seed_start])
+        f.write("{:X}".format(handle + total))
+        f.write(text[seed_end:entities])
+
+        for name, lines in layers.items():
+            if polylines:
+                for chunk in range(0, len(lines), chunk_size):
+                    f.write("".join(
+                        chain_entity(handle + n, owner, name, chain)
+                        for n, chain in enumerate(lines[chunk:chunk + chunk_size], chunk)
+                    ))
+            else:
+                for chunk in range(0, len(lines), chunk_size):
+                    f.write(line_entities(handle + chunk, owner, name, lines[chunk:chunk + chunk_size]))
+            handle += len(lines)
+
+        f.write(text[entities:])
+
+
+def line_entities(handle, owner, layer, lines):
+    coords = lines.coords.reshape(-1, 4).tolist()
+    if lines.bulges is None:
+        return "".join(
+            LINE_ENTITY.format(handle + n, owner, layer, x1, y1, x2, y2)
+            for n, (x1, y1, x2, y2) in enumerate(coords)
+        )
+
+    return "".join(
+        LINE_ENTITY.format(handle + n, owner, layer, *line) if arc is None else
+        ARC_ENTITY.format(handle + n, owner, layer, *arc[0], *arc[1:])
+        for n, (line, arc) in enumerate(zip(coords, arc_parameters(lines)))
+    )
+
+
+def chain_entity(handle, owner, layer, chain):
+    if len(chain) == 1:
+        return line_entities(handle, owner, layer, chain)
+
+    vertices, bulges, closed = polyline_vertices(chain)
+    return LWPOLYLINE_ENTITY.format(handle, owner, layer, len(vertices), int(closed)) + "".join(
+        VERTEX.format(x, y) + (BULGE.format(bulge) if bulge else "")
+        for (x, y), bulge in zip(vertices.tolist(), bulges.tolist())
+    )
+
+
 def unpack(drawing):
     modelspace = drawing.modelspace()
 
-    min_point = Vec2(float('inf'), float('inf'))
-    max_point = Vec2(float('-inf'), float('-inf'))
-
-    layers = defaultdict(list)
+    coords = defaultdict(list)
+    bulges = defaultdict(list)
     colours = {}
 
     for entity in modelspace:
@@ -32,24 +234,155 @@ def unpack(drawing):
             else:
                 colours[entity.dxf.layer] = 0
 
-        start = Vec2(*entity.dxf.start)
-        end = Vec2(*entity.dxf.end)
+        layer = entity.dxf.layer
+        if entity.dxftype() == "LWPOLYLINE":
+            points = entity.get_points("xyb")
+            closes = polyline_closes([point[2] for point in points], entity.closed)
+            coords[layer].extend(polyline_coords([point[:2] for point in points], closes).reshape(-1).tolist())
+            bulges[layer].extend(polyline_bulges([point[2] for point in points], closes).tolist())
+            continue
+
+        if entity.dxftype() in ("ARC", "CIRCLE"):
+            if entity.dxftype() == "ARC":
+                angles = entity.dxf.start_angle, entity.dxf.end_angle
+            else:
+                angles = 0, 360
+            arc = arc_coords(entity.dxf.center, entity.dxf.radius, *angles, entity.dxf.extrusion[2] < 0)
+            coords[layer].extend(arc[0].reshape(-1).tolist())
+            bulges[layer].extend(arc[1].tolist())
+            continue
 
-        min_x = min(start.x, end.x, min_point.x)
-        min_y = min(start.y, end.y, min_point.y)
-        max_x = max(start.x, end.x, max_point.x)
-        max_y = max(start.y, end.y, max_point.y)
+        start = entity.dxf.start
+        end = entity.dxf.end
 
-        min_point = Vec2(min_x, min_y)
-        max_point = Vec2(max_x, max_y)
+        coords[layer].extend((start[0], start[1], end[0], end[1]))
+        bulges[layer].append(0.0)
 
-        layers[entity.dxf.layer].append(Line(start, end))
+    return centred({layer: LineArray(np.array(values), bulges[layer]) for layer, values in coords.items()}), colours
 
+
+def centred(layers):
+    if not layers:
+        return layers
+
+    points = np.concatenate([layer.coords.reshape(-1, 2) for layer in layers.values()])
+    min_point = Vec2(*points.min(axis=0))
+    max_point = Vec2(*points.max(axis=0))
     centre = min_point.midpoint(max_point)
 
-    for layer in layers.values():
-        for line in layer:
-            line.start = line.start - centre
-            line.end = line.end - centre
+    return {name: layer.translated(centre) for name, layer in layers.items()}
+
+
+class UnsupportedDXF(Exception):
+    pass
+
+
+def decode(value):
+    try:
+        return value.decode("utf-8")
+    except UnicodeDecodeError:
+        return value.decode("cp1252")
+
+
+ENTITIES = (b"LINE", b"LWPOLYLINE", b"ARC", b"CIRCLE")
+
+
+def stream(filename):
+    """
+    Reads the modelspace LINE, LWPOLYLINE, ARC and CIRCLE entities of an
+    ASCII DXF file in a single pass over its group codes, without building
+    an ezdxf document. Raises UnsupportedDXF on binary files, any other kind
+    of modelspace entity or arcs that aren't in the XY plane.
+    """
+
+    layer_colours = {}
+    coords = {}
+    bulges = {}
+    section = None
+
+    with open(filename, "rb") as f:
+        if f.read(22).startswith(b"AutoCAD Binary DXF"):
+            raise UnsupportedDXF("binary DXF")
+        f.seek(0)
+
+        pairs = zip(f, f)
+        record = None
+        fields = {}
+        points = []
+        vertex_bulges = []
+
+        for code, value in pairs:
+            code = int(code)
+            value = value.strip()
+
+            if code != 0:
+                if record == b"LWPOLYLINE" and code in (10, 20, 42):
+                    if code == 42:
+                        vertex_bulges[-1] = float(value)
+                    else:
+                        points.append(float(value))
+                        if code == 10:
+                            vertex_bulges.append(0.0)
+                elif record is not None:
+                    fields[code] = value
+                elif code == 2 and section is None:
+                    section = value
+                continue
+
+            if record in ENTITIES and fields.get(67) != b"1":
+                layer = decode(fields.get(8, b"0"))
+                if layer not in coords:
+                    coords[layer] = array("d")
+                    bulges[layer] = array("d")
+                if record == b"LINE":
+                    coords[layer].extend((float(fields.get(10, 0)), float(fields.get(20, 0)),
+                                          float(fields.get(11, 0)), float(fields.get(21, 0))))
+                    bulges[layer].append(0.0)
+                elif record == b"LWPOLYLINE":
+                    closes = polyline_closes(vertex_bulges, int(fields.get(70, 0)) & 1)
+                    coords[layer].extend(polyline_coords(points, closes).reshape(-1))
+                    bulges[layer].extend(polyline_bulges(vertex_bulges, closes))
+                else:
+                    if float(fields.get(210, 0)) or float(fields.get(220, 0)) or abs(float(fields.get(230, 1))) != 1:
+                        raise UnsupportedDXF("{} outside the XY plane".format(decode(record)))
+                    arc = arc_coords((float(fields.get(10, 0)), float(fields.get(20, 0))), float(fields.get(40, 0)),
+                                     float(fields.get(50, 0)), float(fields.get(51, 360)), float(fields.get(230, 1)) < 0)
+                    coords[layer].extend(arc[0].reshape(-1))
+                    bulges[layer].extend(arc[1])
+            elif record == b"LAYER" and 2 in fields:
+                layer_colours[decode(fields[2]).lower()] = int(fields.get(62, 7))
+
+            record = None
+            fields = {}
+            points = []
+            vertex_bulges = []
+
+            if value == b"SECTION":
+                section = None
+            elif value == b"ENDSEC":
+                section = b""
+            elif section == b"ENTITIES":
+                if value not in ENTITIES:
+                    raise UnsupportedDXF("{} entity".format(decode(value)))
+                record = value
+            elif section == b"TABLES" and value == b"LAYER":
+                record = value
+
+    colours = {layer: layer_colours.get(layer.lower(), 0) for layer in coords}
+    layers = {layer: LineArray(np.frombuffer(values, dtype=np.float64), np.frombuffer(bulges[layer], dtype=np.float64))
+              for layer, values in coords.items()}
+
+    return centred(layers), colours
+
+
+def read(filename):
+    """
+    Loads a DXF file into layers and colours as `unpack` does, streaming
+    plain LINE, LWPOLYLINE, ARC and CIRCLE files and falling back to ezdxf
+    for anything else.
+    """
 
-    return layers, colours
+    try:
+        return stream(filename)
+    except UnsupportedDXF:
+        return unpack(ezdxf.readfile(filename))
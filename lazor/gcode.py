@@ -0,0 +1,123 @@
+import os
+from contextlib import suppress
+from typing import NamedTuple
+
+import numpy as np
+
+from lazor.datastructures import LineArray
+from lazor.dxf import COLOURS_FOR_4GROUND
+
+
+class LaserSettings(NamedTuple):
+    feed: float
+    power: float
+
+
+SETTINGS_FOR_4GROUND = {
+    "Cut": LaserSettings(feed=2100, power=1000),
+    "Cut (2nd pass)": LaserSettings(feed=2100, power=1000),
+    "Line": LaserSettings(feed=6000, power=250),
+    "Etch": LaserSettings(feed=6000, power=400),
+    "Score": LaserSettings(feed=4800, power=500),
+    "Sprue": LaserSettings(feed=2100, power=1000),
+}
+
+HEADER = "; LAZOR\nG21\nG90\nM5\n"
+FOOTER = "M2\n"
+
+
+class GCodeError(ValueError):
+    pass
+
+
+def colour_settings(settings=SETTINGS_FOR_4GROUND):
+    """
+    Maps DXF colours to laser settings through the names given to them in
+    COLOURS_FOR_4GROUND.
+    """
+
+    return {colour: settings[name] for colour, name in COLOURS_FOR_4GROUND if name in settings}
+
+
+def number(value):
+    text = "{:.4f}".format(value).rstrip("0").rstrip(".")
+    return "0" if text == "-0" else text
+
+
+def moves(layers, colours, settings=None, tolerance=1e-6, chunk_size=10000):
+    """
+    Yields G-code for cutting layers in order, each line in the order and
+    direction it has in its layer, a chunk of lines at a time. The laser is
+    only switched off to travel to a line that doesn't start within
+    `tolerance` of where the last one ended, so each continuous path is
+    cut in one go. Arcs become G2/G3 moves. Feed rates and powers come from
+    `settings` keyed by layer colour, by default `colour_settings()`.
+    """
+
+    settings = colour_settings() if settings is None else settings
+    missing = sorted({colours[name] for name, lines in layers.items() if len(lines) and colours[name] not in settings})
+    if missing:
+        raise GCodeError("No laser settings for colour{} {}".format("" if len(missing) == 1 else "s", ", ".join(map(str, missing))))
+
+    yield HEADER
+
+    position = np.array((np.nan, np.nan))
+    for name, lines in layers.items():
+        lines = LineArray.from_lines(lines)
+        if not len(lines):
+            continue
+
+        feed, power = settings[colours[name]]
+        yield "; {}\nG1 F{}\n".format(name, number(feed))
+        laser_on = "M4 S{}\n".format(number(power))
+
+        cutting = False
+        for chunk in range(0, len(lines), chunk_size):
+            part = lines[chunk:chunk + chunk_size]
+            previous = np.concatenate([position[None], part.ends[:-1]])
+            travels = ~(np.hypot(*(part.starts - previous).T) <= tolerance)
+            bulges = np.zeros(len(part)) if part.bulges is None else part.bulges
+            offsets = part.centres() - part.starts
+
+            text = []
+            for ((sx, sy), (ex, ey)), travel, bulge, (i, j) in zip(part.coords.tolist(), travels.tolist(),
+                                                                  bulges.tolist(), offsets.tolist()):
+                if travel:
+                    if cutting:
+                        text.append("M5\n")
+                        cutting = False
+                    text.append("G0 X{} Y{}\n".format(number(sx), number(sy)))
+                if not cutting:
+                    text.append(laser_on)
+                    cutting = True
+
+                if bulge:
+                    text.append("{} X{} Y{} I{} J{}\n".format("G3" if bulge > 0 else "G2", number(ex), number(ey), number(i), number(j)))
+                else:
+                    text.append("G1 X{} Y{}\n".format(number(ex), number(ey)))
+
+            position = part.ends[-1]
+            yield "".join(text)
+
+        yield "M5\n"
+
+    yield FOOTER
+
+
+def write(filename, layers, colours, settings=None, tolerance=1e-6, chunk_size=10000):
+    """
+    Saves layers as G-code, see `moves`, streaming it to a temporary file
+    that replaces `filename` once complete.
+    """
+
+    temporary = filename + ".tmp"
+    try:
+        with open(temporary, "wt", encoding="utf-8") as f:
+            for text in moves(layers, colours, settings, tolerance, chunk_size):
+                f.write(text)
+    except BaseException:
+        with suppress(FileNotFoundError):
+            os.remove(temporary)
+        raise
+
+    os.replace(temporary, filename)
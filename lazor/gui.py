@@ -4,28 +4,21 @@ from collections import OrderedDict
 from functools import partial
 from tkinter import ttk, filedialog, messagebox, Button
 
-import ezdxf
 import math
 
 from colour import Color
 
 from lazor.actions import autofix, explode, add_tabs, combine_layers, \
     rename_layer, delete_layers, optimise, laser_estimation, \
-    laser_engraving_estimation, change_colour
+    laser_engraving_estimation, change_colour, optimise_contours, \
+    check_crossings, merge_lines, simplify, fit_curves
 from lazor.analysis import ideal_laser_distance
-from lazor.datastructures import Vec2
-from lazor.dxf import unpack, draw
+from lazor.datastructures import Vec2, LineArray
+from lazor.dxf import read, write, COLOURS_FOR_4GROUND
 from lazor.exceptions import AbortAction
+from lazor import project, gcode
 
 BG_COLOUR = "#808080"
-COLOURS_FOR_4GROUND = [
-    (1, "Cut"),
-    (30, "Cut (2nd pass)"),
-    (5, "Line"),
-    (6, "Etch"),
-    (17, "Score"),
-    (7, "Sprue")
-]
 
 
 class Application(ttk.Frame):
@@ -48,8 +41,12 @@ class Application(ttk.Frame):
         self.columnconfigure(2, weight=0)
 
         self.use_4ground_colours = False
+        self.save_polylines = tk.BooleanVar()
 
-        ttk.Button(self, text="Open File", command=self.open_file).grid(column=0, row=0)
+        file_frame = ttk.Frame(self)
+        file_frame.grid(column=0, row=0)
+        ttk.Button(file_frame, text="Open File", command=self.open_file).pack(side=tk.LEFT)
+        ttk.Button(file_frame, text="Open Project", command=self.open_project).pack(side=tk.LEFT)
 
         ttk.Label(self, textvariable=self.filename, relief="sunken", padding="5 5 5 5").grid(column=1, columnspan=2, row=0, sticky=tk.W+tk.E+tk.N+tk.S)
         ttk.Label(self, textvariable=self.statusbar, relief="sunken", padding="5 5 5 5").grid(column=0, columnspan=3, row=4, sticky=tk.W+tk.E+tk.N+tk.S)
@@ -57,6 +54,7 @@ class Application(ttk.Frame):
         self.canvas = tk.Canvas(self, relief="sunken", bg="white")
         self.canvas.grid(column=0, columnspan=2, row=1, rowspan=2, sticky=tk.W+tk.E+tk.N+tk.S)
         self.canvas.bind("<Configure>", self.redraw_on_event)
+        self.canvas.highlights = []
 
         self.layer_box = tk.Listbox(self, selectmode=tk.EXTENDED, bg=BG_COLOUR)
         self.layer_box.grid(column=2, row=1, sticky=tk.W+tk.E+tk.N+tk.S)
@@ -70,9 +68,14 @@ class Application(ttk.Frame):
 
         for name, callback in [
             ("Autofix", autofix),
+            ("Merge Colinear", merge_lines),
+            ("Simplify", simplify),
+            ("Fit Arcs", fit_curves),
             ("Optimise", optimise),
+            ("Optimise Contours", optimise_contours),
             ("Estimate", laser_estimation),
             ("Estimate Engraving", laser_engraving_estimation),
+            ("Check Crossings", check_crossings),
             ("Add Tabs", add_tabs),
             ("Explode", explode),
             ("Combine", combine_layers),
@@ -84,7 +87,10 @@ class Application(ttk.Frame):
         self.set_colour_buttons()
 
         ttk.Button(self.button_frame, text="Toggle Colour Mode", command=self.toggle_colour_mode).pack(anchor=tk.N)
+        ttk.Checkbutton(self.button_frame, text="Save Polylines", variable=self.save_polylines).pack(anchor=tk.N)
         ttk.Button(self.button_frame, text="Save As", command=self.save_file).pack(anchor=tk.N)
+        ttk.Button(self.button_frame, text="Save Project", command=self.save_project).pack(anchor=tk.N)
+        ttk.Button(self.button_frame, text="Save G-code", command=self.save_gcode).pack(anchor=tk.N)
         self.update_statusbar("Welcome to LAZOR")
 
     def toggle_colour_mode(self):
@@ -129,9 +135,9 @@ class Application(ttk.Frame):
         self.filename.set(filename)
         self.update_statusbar("Loading {}".format(filename))
 
-        drawing = ezdxf.readfile(filename)
         self.layers = OrderedDict()
-        layers, self.colours = unpack(drawing)
+        self.canvas.highlights = []
+        layers, self.colours = read(filename)
         self.layers.update(layers)
 
         self.update_layerbox()
@@ -154,12 +160,69 @@ class Application(ttk.Frame):
             self.update_statusbar("Cancelled file save")
             raise AbortAction()
 
-        dxf = draw(self.layers, self.colours)
-        dxf.saveas(filename)
+        write(filename, self.layers, self.colours, polylines=self.save_polylines.get())
 
         self.update_canvas()
         self.update_statusbar("Saved file as {}".format(filename))
 
+    def open_project(self):
+        filename = filedialog.askopenfilename(filetypes=[("LAZOR projects", ".lzr"), ("All files", ".*")])
+
+        if not filename:
+            self.update_statusbar("Cancelled project open")
+            return
+
+        self.filename.set(filename)
+        self.update_statusbar("Loading {}".format(filename))
+
+        self.layers = OrderedDict()
+        self.canvas.highlights = []
+        layers, self.colours = project.load(filename)
+        self.layers.update(layers)
+
+        self.update_layerbox()
+        self.update_canvas()
+        self.update_statusbar("Loaded {}".format(filename))
+
+    def save_project(self):
+        if not self.layers:
+            messagebox.showerror("Cannot Save", "You cannot save an empty file")
+            raise AbortAction()
+
+        initialdir, initialfile = os.path.split(self.filename.get())
+        initialfile = os.path.splitext(initialfile)[0] + ".lzr"
+        filename = filedialog.asksaveasfilename(filetypes=[("LAZOR projects", ".lzr")], initialfile=initialfile, initialdir=initialdir, defaultextension="lzr")
+
+        if not filename:
+            self.update_statusbar("Cancelled project save")
+            raise AbortAction()
+
+        project.save(filename, self.layers, self.colours)
+
+        self.update_canvas()
+        self.update_statusbar("Saved project as {}".format(filename))
+
+    def save_gcode(self):
+        if not self.layers:
+            messagebox.showerror("Cannot Save", "You cannot save an empty file")
+            raise AbortAction()
+
+        initialdir, initialfile = os.path.split(self.filename.get())
+        initialfile = os.path.splitext(initialfile)[0] + ".gcode"
+        filename = filedialog.asksaveasfilename(filetypes=[("G-code", ".gcode .nc")], initialfile=initialfile, initialdir=initialdir, defaultextension="gcode")
+
+        if not filename:
+            self.update_statusbar("Cancelled G-code save")
+            raise AbortAction()
+
+        try:
+            gcode.write(filename, self.layers, self.colours)
+        except gcode.GCodeError as e:
+            messagebox.showerror("Cannot Save", "{}, use the 4ground colours for every layer".format(e))
+            raise AbortAction()
+
+        self.update_statusbar("Saved G-code as {}".format(filename))
+
     def update_layerbox(self):
         self.layer_box.delete(0, tk.END)
 
@@ -475,13 +538,17 @@ class Application(ttk.Frame):
             )
             return
 
-        dxf_minpoint = Vec2(float('inf'), float('inf'))
-        dxf_maxpoint = Vec2(float('-inf'), float('-inf'))
+        layer_bounds = [LineArray.from_lines(layer).bounds() for layer in self.layers.values() if len(layer)]
+        if not layer_bounds:
+            self.canvas.create_text(
+                *self.canvas.midpoint,
+                text="NO LINES",
+                fill="red"
+            )
+            return
 
-        for layer in self.layers.values():
-            for start, end in layer:
-                dxf_minpoint = Vec2(min(start.x, end.x, dxf_minpoint.x), min(start.y, end.y, dxf_minpoint.y))
-                dxf_maxpoint = Vec2(max(start.x, end.x, dxf_maxpoint.x), max(start.y, end.y, dxf_maxpoint.y))
+        dxf_minpoint = Vec2(min(b.min.x for b in layer_bounds), min(b.min.y for b in layer_bounds))
+        dxf_maxpoint = Vec2(max(b.max.x for b in layer_bounds), max(b.max.y for b in layer_bounds))
 
         self.canvas.dxf_midpoint = dxf_minpoint.midpoint(dxf_maxpoint)
 
@@ -499,11 +566,27 @@ class Application(ttk.Frame):
         layer_colours = self.layer_colours()
 
         for layer_name, layer in self.layers.items():
-            for n, (start, end) in enumerate(layer):
-                start = (start - self.canvas.dxf_midpoint) * self.canvas.drawing_ratio + self.canvas.midpoint
-                end = (end - self.canvas.dxf_midpoint) * self.canvas.drawing_ratio + self.canvas.midpoint
-
-                self.canvas.create_line(start.x, start.y * -1 + canvas_height, end.x, end.y * -1 + canvas_height, fill=layer_colours[self.colours[layer_name]], width=2 if layer_name in selected_layers else 1)
+            lines = LineArray.from_lines(layer)
+            arcs = [] if lines.bulges is None else lines.bulges.nonzero()[0].tolist()
+            coords = lines.coords if not arcs else lines.coords[lines.bulges == 0]
+
+            points = (coords - tuple(self.canvas.dxf_midpoint)) * self.canvas.drawing_ratio + tuple(self.canvas.midpoint)
+            points[..., 1] = points[..., 1] * -1 + canvas_height
+
+            for (start_x, start_y), (end_x, end_y) in points.tolist():
+                self.canvas.create_line(start_x, start_y, end_x, end_y, fill=layer_colours[self.colours[layer_name]], width=2 if layer_name in selected_layers else 1)
+
+            for n in arcs:
+                arc_points = []
+                for point in lines[n].points(16):
+                    x, y = (point - self.canvas.dxf_midpoint) * self.canvas.drawing_ratio + self.canvas.midpoint
+                    arc_points += [x, y * -1 + canvas_height]
+                self.canvas.create_line(*arc_points, fill=layer_colours[self.colours[layer_name]], width=2 if layer_name in selected_layers else 1)
+
+        for point in self.canvas.highlights:
+            x, y = (point - self.canvas.dxf_midpoint) * self.canvas.drawing_ratio + self.canvas.midpoint
+            y = y * -1 + canvas_height
+            self.canvas.create_oval(x - 5, y - 5, x + 5, y + 5, outline="red", width=2)
 
     def action(self, act):
         layers = self.layers
@@ -0,0 +1,113 @@
+import os
+import struct
+from collections import OrderedDict
+
+import numpy as np
+
+from lazor.datastructures import LineArray
+
+MAGIC = b"LAZORPRJ"
+VERSION = 2
+
+HEADER = struct.Struct("<8sII")
+LAYER = struct.Struct("<IiQQQ")
+LAYER_V1 = struct.Struct("<IiQQ")
+
+
+class ProjectError(ValueError):
+    pass
+
+
+def align(offset):
+    return (offset + 7) & ~7
+
+
+def save(filename, layers, colours):
+    """
+    Saves layers to a LAZOR project file. The file is a header, a table of
+    layer names, colours and line counts, then each layer's coordinates as a
+    little endian float64 (N, 2, 2) block aligned to 8 bytes, so `load` can
+    view the blocks straight as LineArrays. Layers holding arcs follow
+    their coordinates with a float64 block of bulges.
+    """
+
+    layers = OrderedDict((name, LineArray.from_lines(lines)) for name, lines in layers.items())
+    names = [name.encode("utf-8") for name in layers]
+
+    offset = HEADER.size + sum(LAYER.size + len(name) for name in names)
+    table = []
+    for name, lines in zip(names, layers.values()):
+        offset = align(offset)
+        bulge_offset = 0
+        if lines.bulges is not None:
+            bulge_offset = offset + lines.coords.nbytes
+        table.append((name, offset, bulge_offset))
+        offset += lines.coords.nbytes
+        if lines.bulges is not None:
+            offset += lines.bulges.nbytes
+
+    temporary = filename + ".tmp"
+    with open(temporary, "wb") as f:
+        f.write(HEADER.pack(MAGIC, VERSION, len(layers)))
+        for (name, offset, bulge_offset), (layer, lines) in zip(table, layers.items()):
+            f.write(LAYER.pack(len(name), colours[layer], len(lines), offset, bulge_offset))
+            f.write(name)
+
+        for (name, offset, bulge_offset), lines in zip(table, layers.values()):
+            f.write(b"\0" * (offset - f.tell()))
+            f.write(lines.coords.astype("<f8", copy=False).tobytes())
+            if bulge_offset:
+                f.write(lines.bulges.astype("<f8", copy=False).tobytes())
+
+    os.replace(temporary, filename)
+
+
+def load(filename):
+    """
+    Loads a LAZOR project file into layers and colours. The file is read in
+    one go and closed, so it can be saved over straight away, and layer
+    coordinates are read-only views onto its contents rather than copies.
+    """
+
+    with open(filename, "rb") as f:
+        data = f.read()
+
+    if len(data) < HEADER.size:
+        raise ProjectError("{} is not a LAZOR project".format(filename))
+
+    magic, version, count = HEADER.unpack_from(data)
+    if magic != MAGIC:
+        raise ProjectError("{} is not a LAZOR project".format(filename))
+    if version > VERSION:
+        raise ProjectError("{} needs a newer version of LAZOR".format(filename))
+
+    layers = OrderedDict()
+    colours = OrderedDict()
+
+    table = LAYER if version > 1 else LAYER_V1
+
+    position = HEADER.size
+    for _ in range(count):
+        if position + table.size > len(data):
+            raise ProjectError("{} is truncated".format(filename))
+        name_length, colour, lines, offset, *bulge_offset = table.unpack_from(data, position)
+        position += table.size
+        if position + name_length > len(data) or offset + lines * 32 > len(data) or \
+                (bulge_offset and bulge_offset[0] + lines * 8 > len(data)):
+            raise ProjectError("{} is truncated".format(filename))
+        name = data[position:position + name_length].decode("utf-8")
+        position += name_length
+
+        if lines:
+            coords = np.frombuffer(data, dtype="<f8", count=lines * 4, offset=offset)
+        else:
+            coords = np.empty((0, 2, 2))
+
+        bulges = None
+        if lines and bulge_offset and bulge_offset[0]:
+            bulges = np.frombuffer(data, dtype="<f8", count=lines, offset=bulge_offset[0])
+
+        layers[name] = LineArray(coords, bulges)
+        colours[name] = colour
+
+    return layers, colours
@@ -0,0 +1,452 @@
+import math
+import os
+import random
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from lazor.analysis import apply_ordering, reverse_chain, ideal_laser_distance, \
+    estimated_laser_time, estimated_motion_time, MotionProfile, \
+    optimise_line_set_ordering, uncached
+from lazor.datastructures import LineArray, KDTree
+
+
+class TravelDistance:
+    """
+    Costs the links between items in a tour by their idle travel in mm, so
+    ordering only shortens travel.
+    """
+
+    unit = "mm"
+    link = staticmethod(math.dist)
+
+    def __init__(self, profile=MotionProfile()):
+        self.profile = profile
+
+    def ports(self, points, directions):
+        return [tuple(point) for point in points.tolist()]
+
+    def estimate(self, layer):
+        return ideal_laser_distance(layer)
+
+
+class TravelTime(TravelDistance):
+    """
+    Costs links by their travel time at constant idle speed, as
+    `estimated_laser_time` does.
+    """
+
+    unit = "seconds"
+
+    def link(self, exit, entry):
+        return math.dist(exit, entry) / self.profile.idle_speed
+
+    def estimate(self, layer):
+        return estimated_laser_time(layer, self.profile.idle_speed, self.profile.active_speed)
+
+
+class MotionTime(TravelDistance):
+    """
+    Costs links by the time the motion model of `estimated_motion_time`
+    predicts for them: the travel move itself, accelerating from and
+    decelerating to the speeds the corners either side of it allow, plus
+    the time the cuts either side lose slowing down for those corners.
+    Cuts are assumed long enough to reach full speed, so links can be
+    costed independently. Ports carry the direction the head leaves an item
+    through them in, so changes of direction are costed too.
+    """
+
+    unit = "seconds"
+
+    def ports(self, points, directions):
+        return [tuple(port) for port in np.concatenate([points, directions], axis=1).tolist()]
+
+    def junction(self, ax, ay, bx, by):
+        sine = math.sqrt(max(0.0, (1 + ax * bx + ay * by) / 2))
+        if sine >= 1 - 1e-9:
+            return math.inf
+        return self.profile.acceleration * self.profile.junction_deviation * sine / (1 - sine)
+
+    def slowdown(self, speed):
+        active = self.profile.active_speed
+        return (active - speed) ** 2 / (2 * self.profile.acceleration * active)
+
+    def link(self, exit, entry):
+        x, y, exit_x, exit_y = exit
+        entry_x, entry_y = -entry[2], -entry[3]
+        active = self.profile.active_speed ** 2
+
+        dx, dy = entry[0] - x, entry[1] - y
+        distance = math.hypot(dx, dy)
+        if not distance:
+            return 2 * self.slowdown(math.sqrt(min(self.junction(exit_x, exit_y, entry_x, entry_y), active)))
+
+        idle, acceleration = self.profile.idle_speed, self.profile.acceleration
+        dx, dy = dx / distance, dy / distance
+        first = min(self.junction(exit_x, exit_y, dx, dy), active, idle ** 2)
+        second = min(self.junction(dx, dy, entry_x, entry_y), active, idle ** 2)
+        first, second = min(first, second + 2 * acceleration * distance), min(second, first + 2 * acceleration * distance)
+
+        peak = min((2 * acceleration * distance + first + second) / 2, idle ** 2)
+        cruising = max(distance - (2 * peak - first - second) / (2 * acceleration), 0)
+        travel = (2 * math.sqrt(peak) - math.sqrt(first) - math.sqrt(second)) / acceleration + cruising / math.sqrt(peak)
+        return travel + self.slowdown(math.sqrt(first)) + self.slowdown(math.sqrt(second))
+
+    def estimate(self, layer):
+        return estimated_motion_time(layer, self.profile)
+
+
+COST_MODELS = {
+    "distance": TravelDistance,
+    "time": TravelTime,
+    "motion": MotionTime,
+}
+
+
+class Tour:
+    """
+    An open cutting tour over items that each have a fixed start and end
+    point, such as lines. `order` holds the item cut at each position and
+    `flipped` whether it is cut from end to start; `entry` and `exit` are the
+    ports the laser arrives at and leaves each position from. The cost of a
+    tour is the sum of `link` between consecutive positions, by default the
+    idle travel between ports given as points. Ports may carry more than a
+    point, see `MotionTime`, so long as they start with one.
+    """
+
+    neighbour_count = 6
+
+    def __init__(self, starts, ends, order, flipped, link=math.dist):
+        self.starts = starts
+        self.ends = ends
+        self.link = link
+        self.size = len(starts)
+        self.position = [0] * self.size
+        self.restore(order, flipped)
+
+        self.tree = None
+        self.neighbour_cache = {}
+
+    def restore(self, order, flipped):
+        starts, ends = self.starts, self.ends
+        self.order = list(order)
+        self.flipped = list(flipped)
+        self.entry = [ends[n] if flip else starts[n] for n, flip in zip(order, flipped)]
+        self.exit = [starts[n] if flip else ends[n] for n, flip in zip(order, flipped)]
+        self.update_positions(0, self.size - 1)
+        self.travel = self.cost()
+
+    def update_positions(self, first, last):
+        for p in range(first, last + 1):
+            self.position[self.order[p]] = p
+
+    def cost(self):
+        return sum(self.link(self.exit[p], self.entry[p + 1]) for p in range(self.size - 1))
+
+    def neighbours(self, item):
+        if item not in self.neighbour_cache:
+            if self.tree is None:
+                self.tree = KDTree([port[:2] for port in self.starts + self.ends])
+
+            found = set()
+            for x, y, *_ in (self.starts[item], self.ends[item]):
+                for point in self.tree.nearest_k(x, y, self.neighbour_count + 1):
+                    found.add(point % self.size)
+            found.discard(item)
+            self.neighbour_cache[item] = sorted(found)
+
+        return self.neighbour_cache[item]
+
+    def reversal_delta(self, first, last):
+        """
+        The change in cost from reversing positions first to last inclusive.
+        """
+
+        entry, exit, link = self.entry, self.exit, self.link
+        delta = 0.0
+        if first > 0:
+            delta += link(exit[first - 1], exit[last]) - link(exit[first - 1], entry[first])
+        if last < self.size - 1:
+            delta += link(entry[first], entry[last + 1]) - link(exit[last], entry[last + 1])
+        return delta
+
+    def reverse(self, first, last):
+        self.travel += self.reversal_delta(first, last)
+
+        stop = last + 1
+        self.order[first:stop] = self.order[first:stop][::-1]
+        self.flipped[first:stop] = [not flip for flip in self.flipped[first:stop][::-1]]
+        self.entry[first:stop], self.exit[first:stop] = self.exit[first:stop][::-1], self.entry[first:stop][::-1]
+        self.update_positions(first, last)
+
+    def move_delta(self, first, last, after, reverse):
+        """
+        The change in cost from moving positions first to last inclusive so
+        that they follow position `after` (-1 for the front of the tour),
+        optionally reversing them. `after` must lie outside first - 1 to last.
+        """
+
+        entry, exit, link = self.entry, self.exit, self.link
+        block_entry, block_exit = (exit[last], entry[first]) if reverse else (entry[first], exit[last])
+
+        delta = 0.0
+        if first > 0:
+            delta -= link(exit[first - 1], entry[first])
+        if last < self.size - 1:
+            delta -= link(exit[last], entry[last + 1])
+        if first > 0 and last < self.size - 1:
+            delta += link(exit[first - 1], entry[last + 1])
+
+        if after >= 0 and after < self.size - 1:
+            delta -= link(exit[after], entry[after + 1])
+        if after >= 0:
+            delta += link(exit[after], block_entry)
+        if after < self.size - 1:
+            delta += link(block_exit, entry[after + 1])
+        return delta
+
+    def move(self, first, last, after, reverse):
+        self.travel += self.move_delta(first, last, after, reverse)
+
+        stop = last + 1
+        for values in (self.order, self.flipped, self.entry, self.exit):
+            block = values[first:stop]
+            if reverse:
+                block = block[::-1]
+            if after > last:
+                values[first:after + 1] = values[stop:after + 1] + block
+            else:
+                values[after + 1:stop] = block + values[after + 1:first]
+
+        if reverse:
+            start = after - (last - first) if after > last else after + 1
+            end = start + last - first + 1
+            self.flipped[start:end] = [not flip for flip in self.flipped[start:end]]
+            self.entry[start:end], self.exit[start:end] = self.exit[start:end], self.entry[start:end]
+
+        self.update_positions(min(first, after + 1), max(last, after))
+
+    def improve_item(self, item):
+        """
+        Applies the first improving 2-opt or Or-opt move found around `item`,
+        returning the positions whose links changed, or None.
+        """
+
+        p = self.position[item]
+        for other in self.neighbours(item):
+            q = self.position[other]
+            lo, hi = min(p, q), max(p, q)
+            for first, last in ((lo + 1, hi), (lo, hi - 1)):
+                if first <= last and self.reversal_delta(first, last) < -1e-9:
+                    self.reverse(first, last)
+                    return first - 1, first, last, last + 1
+
+        for length in (1, 2, 3):
+            for first in sorted({p, p - length + 1}):
+                last = first + length - 1
+                if first < 0 or last >= self.size:
+                    continue
+
+                for other in self.neighbours(item):
+                    q = self.position[other]
+                    for after in (q - 1, q):
+                        if first - 1 <= after <= last:
+                            continue
+                        for reverse in (False, True):
+                            if self.move_delta(first, last, after, reverse) < -1e-9:
+                                self.move(first, last, after, reverse)
+                                if after > last:
+                                    return first - 1, first, after - length, after - length + 1, after, after + 1
+                                return after, after + 1, after + length, after + length + 1, first + length - 1, last + 1
+
+        return None
+
+    def local_search(self, queue, deadline):
+        """
+        Repeatedly improves around the items in `queue` until none of them
+        admit an improving move or the deadline passes, returning False if it
+        ran out of time.
+        """
+
+        queued = set(queue)
+        checks = 0
+        while queue:
+            checks += 1
+            if checks % 64 == 0 and time.time() > deadline:
+                return False
+
+            item = queue.popleft()
+            queued.discard(item)
+
+            changed = self.improve_item(item)
+            if changed is None:
+                continue
+
+            for p in changed:
+                if 0 <= p < self.size and self.order[p] not in queued:
+                    queue.append(self.order[p])
+                    queued.add(self.order[p])
+            if item not in queued:
+                queue.append(item)
+                queued.add(item)
+
+        return True
+
+    def snapshot(self):
+        return list(self.order), list(self.flipped)
+
+    def perturb(self, rng):
+        """
+        A local double bridge: three short consecutive runs of positions
+        A B C are reordered to A C B. Returns the items either side of the
+        links that changed.
+        """
+
+        lengths = [rng.randint(1, 30) for _ in range(3)]
+        if sum(lengths) >= self.size:
+            return []
+        first = rng.randrange(self.size - sum(lengths))
+        a, b, c = lengths
+        self.move(first + a + b, first + a + b + c - 1, first + a - 1, False)
+        cuts = (first - 1, first, first + a - 1, first + a, first + a + c - 1, first + a + c,
+                first + a + b + c - 1, first + a + b + c)
+        return [self.order[p] for p in cuts if 0 <= p < self.size]
+
+
+def search_tour(starts, ends, deadline, seed, link=math.dist):
+    """
+    Improves the tour that cuts every item in the given order and direction
+    with 2-opt and Or-opt moves, then perturbs and re-optimises it until the
+    deadline, returning the best (cost, order, flipped) found.
+    """
+
+    size = len(starts)
+    tour = Tour(starts, ends, range(size), [False] * size, link)
+    rng = random.Random(seed)
+
+    items = list(range(size))
+    if seed:
+        rng.shuffle(items)
+    finished = tour.local_search(deque(items), deadline)
+
+    best_travel = tour.travel
+    best = tour.snapshot()
+
+    while finished and time.time() < deadline:
+        changed = tour.perturb(rng)
+        if not changed:
+            break
+        finished = tour.local_search(deque(changed), deadline)
+
+        if tour.travel < best_travel - 1e-9:
+            best_travel = tour.travel
+            best = tour.snapshot()
+        else:
+            tour.restore(*best)
+
+    tour.restore(*best)
+    return tour.travel, best[0], best[1]
+
+
+def improve_tour(starts, ends, time_budget, workers=None, seed=0, link=math.dist):
+    """
+    Searches for a cheaper tour over items with the given start and end
+    ports than cutting them in order, for up to `time_budget` seconds. An
+    independently seeded search runs on each of `workers` processes (one per
+    core by default). Returns the best (order, flipped) found, or None if
+    nothing beat the original order.
+    """
+
+    deadline = time.time() + time_budget
+    workers = workers or os.cpu_count() or 1
+
+    if workers == 1:
+        results = [search_tour(starts, ends, deadline, seed, link)]
+    else:
+        with ProcessPoolExecutor(workers) as pool:
+            results = list(pool.map(search_tour, *zip(*[(starts, ends, deadline, seed + n, link) for n in range(workers)])))
+
+    cost, order, flipped = min(results, key=lambda result: result[0])
+    if cost >= Tour(starts, ends, range(len(starts)), [False] * len(starts), link).cost():
+        return None
+    return order, flipped
+
+
+def improve_ordering(layer, time_budget=5.0, workers=None, seed=0, cost=None):
+    """
+    Improves the ordering of an already ordered layer under a cost model
+    from COST_MODELS, by default shortening its idle travel, see
+    `improve_tour`.
+    """
+
+    lines = LineArray.from_lines(layer)
+    if len(lines) < 3:
+        return layer
+
+    cost = cost or TravelDistance()
+    start_tangents, end_tangents = lines.tangents()
+    starts = cost.ports(lines.starts, -start_tangents)
+    ends = cost.ports(lines.ends, end_tangents)
+
+    improved = improve_tour(starts, ends, time_budget, workers, seed, cost.link)
+    if improved is None:
+        return layer
+    return apply_ordering(layer, *improved)
+
+
+def improve_chain_ordering(chains, time_budget=5.0, workers=None, seed=0, cost=None):
+    """
+    Improves the ordering of chains, as produced by `order_chains`, under a
+    cost model as `improve_ordering` does, reversing open chains where that
+    helps.
+    """
+
+    if len(chains) < 3:
+        return chains
+
+    cost = cost or TravelDistance()
+    firsts = LineArray.from_lines([chain[0] for chain in chains])
+    lasts = LineArray.from_lines([chain[-1] for chain in chains])
+    starts = cost.ports(firsts.starts, -firsts.tangents()[0])
+    ends = cost.ports(lasts.ends, lasts.tangents()[1])
+
+    improved = improve_tour(starts, ends, time_budget, workers, seed, cost.link)
+    if improved is None:
+        return chains
+    return [reverse_chain(chains[n]) if flip else chains[n] for n, flip in zip(*improved)]
+
+
+def budget_shares(sizes, time_budget):
+    """
+    Yields a time budget for each of a sequence of jobs of the given sizes
+    as it is started, splitting `time_budget` seconds between them in
+    proportion to size. Time a job finishes early with is shared among the
+    rest.
+    """
+
+    deadline = time.time() + time_budget
+    remaining = sum(sizes)
+    for size in sizes:
+        yield max(0.0, (deadline - time.time()) * size / remaining) if remaining else 0.0
+        remaining -= size
+
+
+def optimise_layers(layers, names, time_budget=5.0, cost=None, run=uncached, workers=None):
+    """
+    Orders each of the named layers greedily then improves them under
+    `cost`, as Optimise does, spending up to `time_budget` seconds
+    improving all of them together, see `budget_shares`. The greedy pass is
+    called through `run`, which may be a `ResultCache.run`.
+    """
+
+    for name in names:
+        layers[name] = run(optimise_line_set_ordering, layers[name])
+
+    if time_budget:
+        for name, budget in zip(names, budget_shares([len(layers[name]) for name in names], time_budget)):
+            if budget:
+                layers[name] = improve_ordering(layers[name], budget, workers, cost=cost)
+
+    return layers
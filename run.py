@@ -1,4 +1,7 @@
+from multiprocessing import freeze_support
+
 from lazor.gui import main
 
 if __name__ == "__main__":
+    freeze_support()
     main()
@@ -0,0 +1,169 @@
+import math
+
+import ezdxf
+import numpy as np
+
+from lazor.analysis import fit_arcs, apply_ordering, autofix_layer, merge_colinear, simplify_lines, join_lines, remove_overlaps
+from lazor.datastructures import Vec2, Line, Arc, LineArray
+from lazor.dxf import draw, write, read, unpack, stream
+from lazor.project import save, load
+
+
+def polygon(centre, radius, sides, clockwise=False, start=0):
+    turn = -1 if clockwise else 1
+    points = [Vec2(centre[0] + radius * math.cos(start + turn * 2 * math.pi * n / sides),
+                   centre[1] + radius * math.sin(start + turn * 2 * math.pi * n / sides)) for n in range(sides)]
+    return [Line(points[n], points[(n + 1) % sides]) for n in range(sides)]
+
+
+def test_arc_geometry():
+    arc = Arc(Vec2(1, 0), Vec2(-1, 0), 1)
+    assert np.allclose(tuple(arc.centre()), (0, 0))
+    assert math.isclose(arc.radius(), 1)
+    assert math.isclose(arc.length(), math.pi)
+    assert np.allclose(tuple(arc.points(2)[1]), (0, 1))
+
+    assert np.allclose(tuple(arc.reversed().points(2)[1]), (0, 1))
+    assert np.allclose(tuple(Arc(Vec2(1, 0), Vec2(-1, 0), -1).points(2)[1]), (0, -1))
+    assert arc == arc.reversed() and arc != Arc(Vec2(1, 0), Vec2(-1, 0), -1)
+
+    chord = Line(Vec2(1, 0), Vec2(-1, 0))
+    assert chord != arc and arc != chord
+    assert chord == Arc(Vec2(-1, 0), Vec2(1, 0), 0) == chord and hash(chord) == hash(arc)
+
+    lines = LineArray.from_lines([arc, Line(Vec2(-1, 0), Vec2(1, 0))])
+    assert lines.bulges.tolist() == [1, 0]
+    assert isinstance(lines[0], Arc) and not isinstance(lines[1], Arc)
+    assert np.allclose(lines.lengths(), (math.pi, 2))
+
+
+def test_fit_arcs_replaces_tessellated_circles():
+    square = [Line(Vec2(20, 0), Vec2(30, 0)), Line(Vec2(30, 0), Vec2(30, 10)), Line(Vec2(30, 10), Vec2(20, 10)), Line(Vec2(20, 10), Vec2(20, 0))]
+    octagon = polygon((60, 0), 10, 8)
+    layer = polygon((0, 0), 10, 48) + square + polygon((40, 0), 5, 24, clockwise=True) + octagon
+
+    fitted = fit_arcs(layer, 0.05)
+
+    arcs = [line for line in fitted if isinstance(line, Arc)]
+    assert len(arcs) == 4
+    assert fitted[2:6] == square and fitted[8:] == octagon
+    for arc, (centre, radius, clockwise) in zip(arcs, [((0, 0), 10, False)] * 2 + [((40, 0), 5, True)] * 2):
+        assert np.allclose(tuple(arc.centre()), centre) and math.isclose(arc.radius(), radius)
+        assert (arc.bulge < 0) == clockwise
+
+    assert fitted[0].end == fitted[1].start and fitted[1].end == fitted[0].start
+
+    fitted_array = fit_arcs(LineArray.from_lines(layer), 0.05)
+    assert np.array_equal(fitted_array.coords, LineArray.from_lines(fitted).coords)
+    assert math.isclose(fitted_array.lengths()[:2].sum(), 20 * math.pi)
+
+
+def test_fit_arcs_respects_tolerance():
+    layer = polygon((0, 0), 10, 48)
+
+    assert not any(isinstance(line, Arc) for line in fit_arcs(layer, 0.01))
+
+    rng = np.random.default_rng(0)
+    points = [Vec2(x + rng.uniform(-0.1, 0.1), y) for x, y in (line.start for line in polygon((0, 0), 10, 96))]
+    noisy = [Line(points[n], points[(n + 1) % len(points)]) for n in range(len(points))]
+
+    fitted = fit_arcs(noisy, 0.05)
+    assert len(fitted) < len(noisy)
+
+    n = 0
+    for line in fitted:
+        first = n
+        while points[n % len(points)] != line.end:
+            n += 1
+        if isinstance(line, Arc):
+            assert n - first >= 3
+            for point in points[first:n + 1] + [a.midpoint() for a in noisy[first:n]]:
+                assert abs(point.distance(line.centre()) - line.radius()) <= 0.05 + 1e-9
+
+
+def test_ordering_reverses_arcs():
+    lines = LineArray.from_lines([Arc(Vec2(1, 0), Vec2(-1, 0), 1), Line(Vec2(5, 0), Vec2(6, 0))])
+
+    ordered = apply_ordering(lines, [1, 0], [False, True])
+
+    assert ordered.bulges.tolist() == [0, -1]
+    assert ordered[1] == Arc(Vec2(-1, 0), Vec2(1, 0), -1)
+    assert np.allclose(tuple(ordered[1].points(2)[1]), (0, 1))
+
+
+def test_arcs_round_trip_through_files(tmp_path):
+    layers = {"Cut": fit_arcs(polygon((0, 0), 10, 48) + polygon((40, 0), 5, 24, clockwise=True, start=0.3)[:9], 0.05)}
+    colours = {"Cut": 1}
+
+    for polylines in (False, True):
+        filename = str(tmp_path / "arcs.dxf")
+        write(filename, layers, colours, polylines=polylines)
+
+        drawing = ezdxf.readfile(filename)
+        assert not drawing.audit().errors
+        assert [entity.dxftype() for entity in drawing.modelspace()] == (["ARC"] * 3 if not polylines else ["LWPOLYLINE", "ARC"])
+
+        expected, _ = unpack(draw(layers, colours, polylines=polylines))
+        for loaded, _ in (read(filename), unpack(drawing)):
+            assert np.allclose(loaded["Cut"].coords, expected["Cut"].coords)
+            assert np.allclose(loaded["Cut"].bulges, expected["Cut"].bulges)
+            assert math.isclose(loaded["Cut"].lengths().sum(), 20 * math.pi + 5 * 2 * math.pi * 9 / 24)
+
+    filename = str(tmp_path / "arcs.lzr")
+    save(filename, layers, colours)
+    loaded, _ = load(filename)
+    assert np.array_equal(loaded["Cut"].coords, LineArray.from_lines(layers["Cut"]).coords)
+    assert np.array_equal(loaded["Cut"].bulges, LineArray.from_lines(layers["Cut"]).bulges)
+
+
+def test_stream_reads_arcs_and_circles(tmp_path):
+    filename = str(tmp_path / "curves.dxf")
+    drawing = ezdxf.new("R2007")
+    drawing.modelspace().add_circle((1, 1), 2)
+    drawing.modelspace().add_arc((0, 0), 1, 0, 90, dxfattribs={"extrusion": (0, 0, -1)})
+    drawing.modelspace().add_lwpolyline([(0, 0, 0.5), (1, 0, 0), (1, 1, 0)], format="xyb")
+    drawing.saveas(filename)
+
+    layers, _ = stream(filename)
+    expected, _ = unpack(ezdxf.readfile(filename))
+
+    assert np.allclose(layers["0"].coords, expected["0"].coords)
+    assert np.allclose(layers["0"].bulges, expected["0"].bulges)
+    assert np.allclose(layers["0"].lengths(), [2 * math.pi, 2 * math.pi, math.pi / 2, 4 * math.atan(0.5) / math.sin(2 * math.atan(0.5)) / 2, 1])
+
+
+def test_closed_two_vertex_polylines(tmp_path):
+    filename = str(tmp_path / "circle.dxf")
+    drawing = ezdxf.new("R2007")
+    drawing.modelspace().add_lwpolyline([(0, 0, 1), (10, 0, 1)], format="xyb", close=True)
+    drawing.modelspace().add_lwpolyline([(0, 20, 1), (10, 20, 0)], format="xyb", close=True)
+    drawing.modelspace().add_lwpolyline([(0, 40), (10, 40)], close=True)
+    drawing.saveas(filename)
+
+    for layers, _ in (read(filename), unpack(ezdxf.readfile(filename)), stream(filename)):
+        assert np.allclose(layers["0"].lengths(), [5 * math.pi, 5 * math.pi, 5 * math.pi, 10, 10])
+
+    circle = {"Cut": LineArray.from_lines([Arc(Vec2(0, 0), Vec2(10, 0), 1), Arc(Vec2(10, 0), Vec2(0, 0), 1)])}
+    write(filename, circle, {"Cut": 1}, polylines=True)
+    assert [entity.dxftype() for entity in ezdxf.readfile(filename).modelspace()] == ["LWPOLYLINE"]
+    assert np.allclose(read(filename)[0]["Cut"].lengths(), [5 * math.pi, 5 * math.pi])
+
+
+def test_line_stages_keep_arcs():
+    square = [Line(Vec2(20, 0), Vec2(25, 0)), Line(Vec2(25, 0), Vec2(30, 0)), Line(Vec2(30, 0), Vec2(30, 10)),
+              Line(Vec2(30, 10), Vec2(20, 10)), Line(Vec2(20, 10), Vec2(20, 0))]
+    # A tessellated half circle followed by a straight tail, closed back along the diameter.
+    half = polygon((50, 0), 10, 48)[:24]
+    tail = [Line(Vec2(40, 0), Vec2(45, 0)), Line(Vec2(45, 0), Vec2(50, 0)), Line(Vec2(50, 0), Vec2(60, 0))]
+    fitted = fit_arcs(polygon((0, 0), 10, 48) + square + half + tail, 0.05)
+    arcs = sorted((line.length(), abs(line.bulge)) for line in fitted if isinstance(line, Arc))
+    assert len(arcs) == 3
+
+    for layer in (fitted, LineArray.from_lines(fitted)):
+        for stage in (autofix_layer, join_lines, remove_overlaps, merge_colinear, lambda lines: simplify_lines(lines, 0.05)):
+            result = stage(layer)
+
+            assert np.allclose(sorted((line.length(), abs(line.bulge)) for line in result if isinstance(line, Arc)), arcs)
+            assert math.isclose(LineArray.from_lines(result).lengths().sum(), LineArray.from_lines(fitted).lengths().sum())
+
+        assert len(merge_colinear(layer)) == len(arcs) + 5
@@ -0,0 +1,88 @@
+import ezdxf
+
+from lazor.batch import main
+from lazor.datastructures import Vec2, Line
+from lazor.dxf import draw, unpack
+
+
+def square(x, y):
+    corners = [Vec2(x, y), Vec2(x + 10, y), Vec2(x + 10, y + 10), Vec2(x, y + 10)]
+    return [Line(corners[n], corners[(n + 1) % 4]) for n in range(4)]
+
+
+def test_batch_processes_a_directory(tmp_path, capsys):
+    source = tmp_path / "in"
+    source.mkdir()
+    for n in range(3):
+        lines = square(0, 0) + square(20, 0) + square(0, 0)
+        draw({"Cut": lines}, {"Cut": 1}).saveas(str(source / "part{}.dxf".format(n)))
+
+    result = main([str(source), str(tmp_path / "out"), "--steps", "autofix,explode,optimise,estimate",
+                   "--workers", "2", "--optimise-time", "0", "--cache-dir", str(tmp_path / "cache")])
+
+    assert result == 0
+    layers, colours = unpack(ezdxf.readfile(str(tmp_path / "out" / "part1.dxf")))
+    assert sorted(layers) == ["Cut 1", "Cut 2"]
+    assert [len(layer) for layer in layers.values()] == [4, 4]
+    assert colours == {"Cut 1": 1, "Cut 2": 1}
+
+    output = capsys.readouterr().out
+    assert "part2.dxf: autofix: 12 lines, reduced to 8" in output
+    assert "Processed 3 of 3 files" in output
+
+
+def test_batch_reuses_cached_results(tmp_path, capsys):
+    source = tmp_path / "in"
+    source.mkdir()
+    for n in range(2):
+        draw({"Cut": square(0, 0) + square(20, 0)}, {"Cut": 1}).saveas(str(source / "part{}.dxf".format(n)))
+
+    arguments = [str(source), str(tmp_path / "out"), "--steps", "autofix,explode,optimise",
+                 "--workers", "1", "--optimise-time", "0", "--cache-dir", str(tmp_path / "cache")]
+
+    assert main(arguments) == 0
+    assert "part0.dxf: 0 cache hits, 5 misses" in capsys.readouterr().out
+
+    assert main(arguments) == 0
+    output = capsys.readouterr().out
+    assert "part0.dxf: 5 cache hits, 0 misses" in output
+    assert "part1.dxf: 5 cache hits, 0 misses" in output
+
+
+def test_batch_writes_gcode(tmp_path):
+    source = tmp_path / "in"
+    source.mkdir()
+    draw({"Cut": square(0, 0) + square(20, 0)}, {"Cut": 1}).saveas(str(source / "part.dxf"))
+
+    result = main([str(source), str(tmp_path / "out"), "--steps", "optimise", "--gcode",
+                   "--workers", "1", "--optimise-time", "0", "--no-cache"])
+
+    assert result == 0
+    text = (tmp_path / "out" / "part.gcode").read_text()
+    assert text.count("G0") == 2 and text.count("M4") == 2 and text.count("G1 X") == 8
+
+
+def test_batch_optimises_for_predicted_time(tmp_path, capsys):
+    source = tmp_path / "in"
+    source.mkdir()
+    draw({"Cut": square(40, 0) + square(0, 0) + square(20, 0)}, {"Cut": 1}).saveas(str(source / "part.dxf"))
+
+    result = main([str(source), str(tmp_path / "out"), "--steps", "optimise", "--optimise-for", "motion",
+                   "--workers", "1", "--optimise-time", "0.5", "--no-cache"])
+
+    assert result == 0
+    assert "part.dxf: optimise: predicted" in capsys.readouterr().out
+
+
+def test_batch_reports_simplify_savings(tmp_path, capsys):
+    source = tmp_path / "in"
+    source.mkdir()
+    points = [Vec2(x, 0.001 * (x % 2)) for x in range(21)]
+    draw({"Cut": [Line(a, b) for a, b in zip(points, points[1:])]}, {"Cut": 1}).saveas(str(source / "part.dxf"))
+
+    result = main([str(source), str(tmp_path / "out"), "--steps", "simplify", "--workers", "1", "--no-cache"])
+
+    assert result == 0
+    output = capsys.readouterr().out
+    assert "part.dxf: simplify: 20 lines, simplified to 1" in output
+    assert "part.dxf: simplify: predicted" in output
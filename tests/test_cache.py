@@ -0,0 +1,92 @@
+import os
+import tempfile
+
+from lazor.analysis import join_lines, collate_lines
+from lazor.cache import ResultCache
+from lazor.datastructures import Vec2, Line, LineArray
+
+
+def square(x, y):
+    corners = [Vec2(x, y), Vec2(x + 10, y), Vec2(x + 10, y + 10), Vec2(x, y + 10)]
+    return [Line(corners[n], corners[(n + 1) % 4]) for n in range(4)]
+
+
+def test_cache_hits_skip_computation(tmp_path):
+    cache = ResultCache(str(tmp_path))
+    lines = square(0, 0) + square(20, 0) + square(0, 0)
+    calls = []
+
+    def counted(layer, **params):
+        calls.append(params)
+        return join_lines(layer, **params)
+
+    counted.__name__ = "join_lines"
+
+    first = cache.run(counted, lines, unify_distance=0.1)
+    second = cache.run(counted, list(lines), unify_distance=0.1)
+    cache.run(counted, lines, unify_distance=0.2)
+    cache.run(counted, LineArray.from_lines(lines), unify_distance=0.1)
+
+    assert second == first == join_lines(lines, unify_distance=0.1)
+    assert len(calls) == 3
+    assert (cache.hits, cache.misses) == (1, 3)
+    assert cache.describe() == "1 cache hit, 3 misses"
+
+    groups = cache.run(collate_lines, lines)
+    assert [group.lines for group in ResultCache(str(tmp_path)).run(collate_lines, lines)] == [group.lines for group in groups]
+
+
+def test_cache_evicts_least_recently_used(tmp_path):
+    cache = ResultCache(str(tmp_path), max_size=0)
+    layers = [square(x, 0) for x in range(3)]
+
+    for layer in layers:
+        cache.run(join_lines, layer)
+
+    assert os.listdir(str(tmp_path)) == []
+
+    cache.max_size = 10 ** 6
+    for layer in layers:
+        cache.run(join_lines, layer)
+    oldest = cache.path(cache.key("join_lines", layers[0], {}))
+    os.utime(oldest, (0, 0))
+    cache.run(join_lines, layers[0])
+
+    cache.max_size = os.path.getsize(oldest)
+    cache.evict()
+
+    assert os.listdir(str(tmp_path)) == [os.path.basename(oldest)]
+
+
+def test_cache_only_scans_when_over_size(tmp_path, monkeypatch):
+    cache = ResultCache(str(tmp_path))
+    scans = []
+    scandir = os.scandir
+    monkeypatch.setattr(os, "scandir", lambda path: scans.append(path) or scandir(path))
+
+    for x in range(10):
+        cache.run(join_lines, square(x, 0))
+    assert len(scans) == 1
+
+    cache.max_size = cache.size + 1
+    cache.run(join_lines, square(20, 0))
+    assert len(scans) == 2 and cache.size <= cache.max_size
+
+
+def test_cache_falls_back_to_computing_on_filesystem_errors(tmp_path, monkeypatch):
+    blocked = tmp_path / "file"
+    blocked.write_bytes(b"")
+    lines = square(0, 0) + square(0, 0)
+
+    cache = ResultCache(str(blocked / "cache"))
+    assert cache.run(join_lines, lines) == join_lines(lines)
+    assert cache.describe() == "cache unavailable"
+
+    def full(*args, **kwargs):
+        raise OSError(28, "No space left on device")
+
+    cache = ResultCache(str(tmp_path / "cache"))
+    monkeypatch.setattr(tempfile, "mkstemp", full)
+    assert cache.run(join_lines, lines) == join_lines(lines)
+    assert cache.run(join_lines, lines) == join_lines(lines)
+    assert cache.describe() == "cache unavailable" and os.listdir(cache.directory) == []
@@ -0,0 +1,36 @@
+from lazor.analysis import collate_lines
+from lazor.datastructures import Vec2, Line
+
+
+def square(x, y, size=1):
+    corners = [Vec2(x, y), Vec2(x + size, y), Vec2(x + size, y + size), Vec2(x, y + size)]
+    return [Line(corners[n], corners[(n + 1) % 4]) for n in range(4)]
+
+
+def test_collate_lines_separates_disconnected_parts():
+    lines = square(0, 0) + square(5, 5) + [Line(Vec2(10, 0), Vec2(12, 0))]
+
+    line_sets = collate_lines(lines)
+
+    assert [len(line_set) for line_set in line_sets] == [4, 4, 1]
+    assert [line_set.loop for line_set in line_sets] == [True, True, False]
+
+
+def test_collate_lines_joins_parts_connected_late():
+    a, b, c, d = Vec2(0, 0), Vec2(1, 0), Vec2(2, 0), Vec2(3, 0)
+    lines = [Line(a, b), Line(c, d), Line(b, c)]
+
+    line_sets = collate_lines(lines)
+
+    assert len(line_sets) == 1
+    assert list(line_sets[0]) == lines
+    assert not line_sets[0].loop
+
+
+def test_collate_lines_ignores_duplicates():
+    a, b = Vec2(0, 0), Vec2(1, 0)
+
+    line_sets = collate_lines([Line(a, b), Line(b, a)])
+
+    assert len(line_sets) == 1
+    assert len(line_sets[0]) == 1
@@ -0,0 +1,100 @@
+import random
+from fractions import Fraction
+
+from lazor.analysis import find_crossings, split_at_crossings
+from lazor.datastructures import Vec2, Line, LineArray
+
+
+def random_lines(seed, count):
+    rng = random.Random(seed)
+    lines = [Line(Vec2(rng.uniform(0, 100), rng.uniform(0, 100)), Vec2(rng.uniform(0, 100), rng.uniform(0, 100)))
+             for _ in range(count)]
+    for _ in range(count // 10):
+        x, y = rng.uniform(0, 100), rng.uniform(0, 100)
+        lines.append(Line(Vec2(x, rng.uniform(0, 100)), Vec2(x, rng.uniform(0, 100))))
+        lines.append(Line(Vec2(rng.uniform(0, 100), y), Vec2(rng.uniform(0, 100), y)))
+    return lines
+
+
+def polygon(*points):
+    points = [Vec2(*point) for point in points]
+    return [Line(points[n], points[(n + 1) % len(points)]) for n in range(len(points))]
+
+
+def test_crossings_match_brute_force_pairs():
+    for seed in range(5):
+        lines = random_lines(seed, 150)
+
+        crossings = find_crossings(lines)
+        first, second = LineArray.from_lines(lines).intersecting_pairs()
+
+        assert {crossing.lines for crossing in crossings} == set(zip(first.tolist(), second.tolist()))
+
+
+def exact_crossings(segments):
+    def contains(segment, point):
+        (x0, y0), (x1, y1) = segment
+        return (x1 - x0) * (point[1] - y0) == (y1 - y0) * (point[0] - x0) and \
+            min(x0, x1) <= point[0] <= max(x0, x1) and min(y0, y1) <= point[1] <= max(y0, y1)
+
+    points = set()
+    for i, a in enumerate(segments):
+        for b in segments[:i]:
+            (x1, y1), (x2, y2) = a
+            (x3, y3), (x4, y4) = b
+            denominator = (x2 - x1) * (y4 - y3) - (y2 - y1) * (x4 - x3)
+            if denominator == 0:
+                points.update(p for p in a if contains(b, p) and p not in b)
+                points.update(p for p in b if contains(a, p) and p not in a)
+                continue
+            t = Fraction((x3 - x1) * (y4 - y3) - (y3 - y1) * (x4 - x3), denominator)
+            u = Fraction((x3 - x1) * (y2 - y1) - (y3 - y1) * (x2 - x1), denominator)
+            point = (x1 + t * (x2 - x1), y1 + t * (y2 - y1))
+            if 0 <= t <= 1 and 0 <= u <= 1 and not (point in a and point in b):
+                points.add(point)
+
+    return {(round(float(x), 9), round(float(y), 9)): tuple(n for n, segment in enumerate(segments) if contains(segment, (x, y)))
+            for x, y in points}
+
+
+def test_crossings_handle_shared_points_and_overlaps():
+    for seed in range(200):
+        rng = random.Random(seed)
+        grid, count = rng.randint(3, 8), rng.randint(2, 25)
+        segments = []
+        while len(segments) < count:
+            a, b = (rng.randrange(grid), rng.randrange(grid)), (rng.randrange(grid), rng.randrange(grid))
+            if a != b:
+                segments.append((a, b))
+
+        crossings = find_crossings([Line(Vec2(*a), Vec2(*b)) for a, b in segments])
+
+        assert {(round(c.point.x, 9), round(c.point.y, 9)): c.lines for c in crossings} == exact_crossings(segments)
+
+
+def test_closed_shapes_do_not_cross():
+    lines = [line for x in range(5) for y in range(5) for line in polygon((x, y), (x + 1, y), (x + 1, y + 1), (x, y + 1))]
+
+    assert find_crossings(lines) == []
+
+
+def test_lines_meeting_at_a_point_report_one_crossing():
+    lines = [Line(Vec2(-1, -1), Vec2(1, 1)), Line(Vec2(-1, 1), Vec2(1, -1)), Line(Vec2(0, -1), Vec2(0, 1)), Line(Vec2(0, 0), Vec2(3, 0))]
+
+    crossings = find_crossings(lines)
+
+    assert len(crossings) == 1
+    assert crossings[0].point == Vec2(0, 0)
+    assert crossings[0].lines == (0, 1, 2, 3)
+
+
+def test_split_at_crossings():
+    lines = LineArray.from_lines(random_lines(7, 100))
+
+    crossings = find_crossings(lines)
+    split = split_at_crossings(lines, crossings)
+
+    assert isinstance(split, LineArray)
+    assert len(split) == len(lines) + sum(len(crossing.lines) for crossing in crossings)
+    assert find_crossings(split) == []
+    assert abs(sum(split.lengths()) - sum(lines.lengths())) < 1e-6
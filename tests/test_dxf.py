@@ -0,0 +1,77 @@
+import random
+
+import ezdxf
+import numpy as np
+
+from lazor.datastructures import Vec2, Line
+from lazor.dxf import draw, unpack, read, write
+
+
+def random_lines(seed, count):
+    rng = random.Random(seed)
+    return [Line(Vec2(rng.uniform(-50, 150), rng.uniform(-50, 150)), Vec2(rng.uniform(-50, 150), rng.uniform(-50, 150)))
+            for _ in range(count)]
+
+
+def assert_same(actual, expected):
+    assert list(actual[0]) == list(expected[0])
+    for name in expected[0]:
+        assert np.allclose(actual[0][name].coords, expected[0][name].coords)
+    assert actual[1] == expected[1]
+
+
+def test_read_matches_unpack(tmp_path):
+    filename = str(tmp_path / "lines.dxf")
+    draw({"Cut": random_lines(0, 200), "Engrave": random_lines(1, 50)}, {"Cut": 1, "Engrave": 5}).saveas(filename)
+
+    assert_same(read(filename), unpack(ezdxf.readfile(filename)))
+
+
+def test_read_falls_back_for_binary_files(tmp_path):
+    filename = str(tmp_path / "binary.dxf")
+    draw({"Cut": random_lines(2, 10)}, {"Cut": 3}).saveas(filename, fmt="bin")
+
+    assert_same(read(filename), unpack(ezdxf.readfile(filename)))
+
+
+def test_write_matches_draw(tmp_path):
+    layers = {"Cut": random_lines(3, 300), "Engrave": random_lines(4, 20), "Empty": []}
+    colours = {"Cut": 1, "Engrave": 5, "Empty": 3}
+    filename = str(tmp_path / "written.dxf")
+
+    write(filename, layers, colours)
+
+    drawing = ezdxf.readfile(filename)
+    auditor = drawing.audit()
+    assert not auditor.errors and not auditor.fixes
+    assert [layer.dxf.name for layer in drawing.layers][-3:] == ["Cut", "Engrave", "Empty"]
+    handles = [entity.dxf.handle for entity in drawing.entitydb.values()]
+    assert len(handles) == len(set(handles))
+    assert int(drawing.header["$HANDSEED"], 16) > max(int(handle, 16) for handle in handles)
+
+    assert_same(unpack(drawing), unpack(draw(layers, colours)))
+
+
+def polygon(*points):
+    points = [Vec2(*point) for point in points]
+    return [Line(points[n], points[(n + 1) % len(points)]) for n in range(len(points))]
+
+
+def test_write_chains_polylines(tmp_path):
+    square = polygon((0, 0), (10, 0), (10, 10), (0, 10))
+    path = [Line(Vec2(20, 0), Vec2(25, 5)), Line(Vec2(25, 5), Vec2(30, 0))]
+    single = [Line(Vec2(40, 0), Vec2(40, 10))]
+    layers = {"Cut": square + path + single}
+    filename = str(tmp_path / "polylines.dxf")
+
+    write(filename, layers, {"Cut": 1}, polylines=True)
+
+    drawing = ezdxf.readfile(filename)
+    assert not drawing.audit().errors
+    entities = list(drawing.modelspace())
+    assert [entity.dxftype() for entity in entities] == ["LWPOLYLINE", "LWPOLYLINE", "LINE"]
+    assert entities[0].closed and list(entities[0].get_points("xy")) == [(0, 0), (10, 0), (10, 10), (0, 10)]
+    assert not entities[1].closed and len(entities[1]) == 3
+
+    assert_same(read(filename), unpack(draw(layers, {"Cut": 1})))
+    assert_same(unpack(drawing), unpack(draw(layers, {"Cut": 1}, polylines=True)))
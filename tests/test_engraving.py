@@ -0,0 +1,46 @@
+import math
+import random
+
+from lazor.analysis import sweep_scanlines, even_odd_spans, estimated_engrave_time
+from lazor.datastructures import Vec2, Line
+
+
+def polygon(*points):
+    points = [Vec2(*point) for point in points]
+    return [Line(points[n], points[(n + 1) % len(points)]) for n in range(len(points))]
+
+
+def test_sweep_matches_brute_force_intersections():
+    rng = random.Random(0)
+    lines = [Line(Vec2(rng.randrange(50), rng.randrange(50)), Vec2(rng.randrange(50), rng.randrange(50))) for _ in range(200)]
+
+    for y, active in sweep_scanlines(lines, -0.25, 0.5, 102):
+        expected = sorted((min(l.start.x, l.end.x), max(l.start.x, l.end.x))
+                          for l in lines if min(l.start.y, l.end.y) < y < max(l.start.y, l.end.y))
+        assert sorted((edge[2], edge[3]) for edge in active) == expected
+
+
+def test_even_odd_spans_skip_holes():
+    lines = polygon((0, 0), (10, 0), (10, 10), (0, 10)) + polygon((4, 4), (6, 4), (6, 6), (4, 6))
+
+    scanlines = {y: even_odd_spans(y, active) for y, active in sweep_scanlines(lines, 1, 4, 3)}
+
+    assert scanlines == {
+        1: [(0, 10)],
+        5: [(0, 4), (6, 10)],
+        9: [(0, 10)],
+    }
+
+
+def test_estimate_runs_without_a_canvas():
+    lines = polygon((0, 0), (10, 0), (10, 10), (0, 10)) + polygon((4, 4), (6, 4), (6, 6), (4, 6))
+    calls = []
+
+    estimate = estimated_engrave_time(lines, 100, 10, 1, progress=lambda *args: calls.append(args), progress_rate=0.001)
+
+    assert len(estimate.scanlines) == 11
+    assert estimate.scanlines[5].spans == [(0, 4), (6, 10)]
+    assert estimate.scanlines[0].spans == []
+    assert math.isclose(estimate.idle_time, 1 / 10)
+    assert math.isclose(estimate.time, 1 / 10 + 10 * (110 / 100 + 1 / 10))
+    assert [(done, total) for done, total, _ in calls] == [(1, 11), (11, 11)]
@@ -0,0 +1,77 @@
+import math
+
+import numpy as np
+import pytest
+
+from lazor.datastructures import Vec2, Line, Arc
+from lazor.gcode import moves, write, colour_settings, GCodeError, LaserSettings
+
+
+def polygon(*points):
+    points = [Vec2(*point) for point in points]
+    return [Line(points[n], points[(n + 1) % len(points)]) for n in range(len(points))]
+
+
+def test_colour_settings_follow_4ground_colours():
+    settings = colour_settings()
+
+    assert set(settings) == {1, 30, 5, 6, 17, 7}
+    assert settings[1].power > settings[5].power
+
+
+def test_moves_merge_continuous_paths():
+    square = polygon((0, 0), (10, 0), (10, 10), (0, 10))
+    path = [Line(Vec2(20, 0), Vec2(25, 5)), Line(Vec2(25, 5), Vec2(30, 0))]
+    layers = {"Cut": square + path, "Line": [Line(Vec2(30, 0), Vec2(40, 0))]}
+    colours = {"Cut": 1, "Line": 5}
+    settings = {1: LaserSettings(2100, 1000), 5: LaserSettings(6000, 250.5)}
+
+    lines = "".join(moves(layers, colours, settings)).splitlines()
+
+    assert lines[lines.index("; Cut"):] == [
+        "; Cut", "G1 F2100",
+        "G0 X0 Y0", "M4 S1000", "G1 X10 Y0", "G1 X10 Y10", "G1 X0 Y10", "G1 X0 Y0", "M5",
+        "G0 X20 Y0", "M4 S1000", "G1 X25 Y5", "G1 X30 Y0",
+        "M5",
+        "; Line", "G1 F6000",
+        "M4 S250.5", "G1 X40 Y0",
+        "M5",
+        "M2",
+    ]
+    assert "".join(moves(layers, colours, settings, chunk_size=2)) == "\n".join(lines) + "\n"
+
+
+def test_moves_cut_arcs():
+    layers = {"Cut": [Arc(Vec2(1, 0), Vec2(-1, 0), 1), Arc(Vec2(-1, 0), Vec2(1, 0), -math.tan(math.pi / 8))]}
+
+    lines = "".join(moves(layers, {"Cut": 1})).splitlines()
+
+    assert lines[-6:] == ["G0 X1 Y0", "M4 S1000", "G3 X-1 Y0 I-1 J0", "G2 X1 Y0 I1 J-1", "M5", "M2"]
+
+
+def test_moves_need_settings_for_every_colour():
+    with pytest.raises(GCodeError):
+        list(moves({"Cut": polygon((0, 0), (1, 0), (1, 1)), "Other": polygon((0, 0), (1, 0), (1, 1))}, {"Cut": 1, "Other": 250}))
+
+
+def test_write_streams_large_layers(tmp_path):
+    rng = np.random.default_rng(0)
+    layers = {"Cut": [Line(Vec2(*start), Vec2(*end)) for start, end in rng.uniform(0, 100, (2000, 2, 2))]}
+    filename = str(tmp_path / "job.gcode")
+
+    write(filename, layers, {"Cut": 1}, chunk_size=100)
+
+    with open(filename) as f:
+        text = f.read()
+    assert text == "".join(moves(layers, {"Cut": 1}))
+    assert text.count("M4") == 2000 and text.count("G0") == 2000
+
+
+def test_write_reports_the_real_error(tmp_path):
+    with pytest.raises(FileNotFoundError) as error:
+        write(str(tmp_path / "missing" / "job.gcode"), {"Cut": polygon((0, 0), (1, 0), (1, 1))}, {"Cut": 1})
+    assert error.value.filename.endswith("job.gcode.tmp")
+
+    with pytest.raises(GCodeError):
+        write(str(tmp_path / "job.gcode"), {"Cut": polygon((0, 0), (1, 0), (1, 1))}, {"Cut": 250})
+    assert list(tmp_path.iterdir()) == []
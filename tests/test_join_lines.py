@@ -0,0 +1,116 @@
+import math
+import random
+from functools import reduce
+
+from lazor.analysis import join_lines, remove_overlaps
+from lazor.datastructures import Vec2, Line, LineArray
+
+
+def brute_force_join_lines(lines, unify_distance=0.01):
+    edges = set()
+    verts_set = []
+
+    for line in lines:
+        start_v = None
+        end_v = None
+        for v, vert_set in enumerate(verts_set):
+            for vert in vert_set:
+                if start_v is None and line.start.distance(vert) < unify_distance:
+                    start_v = v
+                if end_v is None and line.end.distance(vert) < unify_distance:
+                    end_v = v
+
+        if start_v is None:
+            start_v = len(verts_set)
+            verts_set.append({line.start})
+        else:
+            verts_set[start_v].add(line.start)
+        if end_v is None:
+            end_v = len(verts_set)
+            verts_set.append({line.end})
+        else:
+            verts_set[end_v].add(line.end)
+
+        edge = frozenset((start_v, end_v))
+        if len(edge) != 2:
+            continue
+        edges.add(edge)
+
+    verts = [reduce(lambda a, b: a.midpoint(b), vert_set) for vert_set in verts_set]
+
+    return [Line(verts[s], verts[e]) for s, e in edges if verts[s].distance(verts[e]) >= unify_distance]
+
+
+def noisy_grid_lines(seed, count):
+    rng = random.Random(seed)
+    corners = [Vec2(x * 0.5, y * 0.5) for x in range(8) for y in range(8)]
+
+    def jitter(p):
+        return Vec2(p.x + rng.uniform(-0.006, 0.006), p.y + rng.uniform(-0.006, 0.006))
+
+    return [Line(jitter(rng.choice(corners)), jitter(rng.choice(corners))) for _ in range(count)]
+
+
+def test_join_lines_matches_brute_force():
+    for seed in range(5):
+        lines = noisy_grid_lines(seed, 300)
+        joined = join_lines(lines)
+        expected = brute_force_join_lines(lines)
+
+        assert len(joined) == len(expected)
+        for a, b in zip(joined, expected):
+            assert a.start == b.start and a.end == b.end
+
+
+def test_join_lines_removes_duplicates():
+    a, b, c = Vec2(0, 0), Vec2(10, 0), Vec2(10, 10)
+    lines = [Line(a, b), Line(b, a), Line(b + Vec2(0.001, 0), c), Line(a, Vec2(0.002, 0.002))]
+
+    assert len(join_lines(lines)) == 2
+
+
+def test_remove_overlaps_merges_colinear_runs():
+    lines = [
+        Line(Vec2(0, 0), Vec2(10, 0)),
+        Line(Vec2(15, 0), Vec2(5, 0)),
+        Line(Vec2(12, 0), Vec2(14, 0)),
+        Line(Vec2(15, 0), Vec2(20, 0)),
+        Line(Vec2(0, 1), Vec2(3, 4)),
+        Line(Vec2(1, 2), Vec2(2, 3)),
+        Line(Vec2(0, 5), Vec2(10, 5)),
+    ]
+
+    merged = remove_overlaps(lines)
+
+    assert merged == [
+        Line(Vec2(0, 0), Vec2(15, 0)),
+        Line(Vec2(15, 0), Vec2(20, 0)),
+        Line(Vec2(0, 1), Vec2(3, 4)),
+        Line(Vec2(0, 5), Vec2(10, 5)),
+    ]
+    assert remove_overlaps(LineArray.from_lines(lines)).to_lines() == merged
+
+
+def test_remove_overlaps_keeps_separate_lines():
+    lines = [Line(Vec2(x, y), Vec2(x + 1, y + 0.5)) for x in range(10) for y in range(10)]
+
+    assert remove_overlaps(lines) == lines
+
+
+def test_remove_overlaps_across_bucket_boundaries():
+    for first, second in [
+        (Line(Vec2(0, 0), Vec2(0, 10)), Line(Vec2(1e-7, 5), Vec2(-1e-7, 15))),
+        (Line(Vec2(0, 0), Vec2(10, 1e-7)), Line(Vec2(5, 0), Vec2(15, -1e-7))),
+        (Line(Vec2(0, 0.005), Vec2(10, 0.005)), Line(Vec2(5, 0.0050001), Vec2(15, 0.0050001))),
+        (Line(Vec2(0, -0.005), Vec2(10, -0.005)), Line(Vec2(15, -0.0050001), Vec2(5, -0.0050001))),
+    ]:
+        merged = remove_overlaps([first, second])
+
+        assert len(merged) == 1
+        assert merged[0].start == first.start and math.isclose(merged[0].length(), 15)
+
+
+def test_remove_overlaps_keeps_close_parallel_lines():
+    lines = [Line(Vec2(0, 0), Vec2(10, 0)), Line(Vec2(1, 0.015), Vec2(9, 0.015)), Line(Vec2(2, 0), Vec2(12, 0))]
+
+    assert remove_overlaps(lines) == [Line(Vec2(0, 0), Vec2(12, 0)), lines[1]]
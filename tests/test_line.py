@@ -0,0 +1,84 @@
+import pickle
+import random
+
+import pytest
+
+from lazor.datastructures import Vec2, Line, Arc, LineArray
+
+
+def test_vec2_is_immutable():
+    point = Vec2(1, 2)
+
+    with pytest.raises(TypeError):
+        point[0] = 5
+    with pytest.raises(AttributeError):
+        point.z = 5
+    with pytest.raises(AttributeError):
+        point.x = 5
+    with pytest.raises(AttributeError):
+        del point.y
+    assert point == Vec2(1, 2) and hash(point) == hash((1.0, 2.0))
+
+
+def test_line_is_immutable():
+    line = Line(Vec2(0, 0), Vec2(3, 4))
+    hash(line)
+
+    with pytest.raises(AttributeError):
+        line.start = Vec2(1, 1)
+    with pytest.raises(AttributeError):
+        del line.end
+    with pytest.raises(AttributeError):
+        Arc(Vec2(0, 0), Vec2(1, 0), 1).bulge = 0
+    assert line.length() == 5 and hash(line) == hash(Line(Vec2(3, 4), Vec2(0, 0)))
+
+
+def test_line_hash_ignores_direction():
+    a, b = Vec2(0, 0), Vec2(3, 4)
+
+    assert hash(Line(a, b)) == hash(Line(b, a))
+    assert len({Line(a, b), Line(b, a)}) == 1
+
+
+def test_cached_values():
+    line = Line(Vec2(0, 0), Vec2(3, 4))
+
+    assert line.length() == 5
+    assert line.normalized() == Vec2(0.6, 0.8)
+    assert line.normalized() is line.normalized()
+
+
+def test_pickle_round_trip():
+    line = Line(Vec2(1, 2), Vec2(3, 4))
+    hash(line)
+
+    copy = pickle.loads(pickle.dumps(line))
+
+    assert copy == line
+    assert hash(copy) == hash(line)
+    assert copy.line == Vec2(2, 2)
+
+    arc = pickle.loads(pickle.dumps(Arc(Vec2(0, 0), Vec2(1, 0), 0.5), pickle.HIGHEST_PROTOCOL))
+    assert isinstance(arc, Arc) and arc.bulge == 0.5 and isinstance(arc.start, Vec2)
+
+
+def test_colinear_lines_touching_intersect():
+    assert Line(Vec2(0, 0), Vec2(2, 0)).intersect(Line(Vec2(1, 0), Vec2(3, 0)))
+    assert Line(Vec2(0, 0), Vec2(2, 0)).intersect(Line(Vec2(2, 0), Vec2(2, 5)))
+    assert not Line(Vec2(0, 0), Vec2(2, 0)).intersect(Line(Vec2(3, 0), Vec2(4, 0)))
+
+
+def test_intersection_kernel_matches_line_intersect():
+    rng = random.Random(0)
+    lines = [Line(Vec2(rng.randrange(6), rng.randrange(6)), Vec2(rng.randrange(6), rng.randrange(6))) for _ in range(150)]
+    array = LineArray.from_lines(lines)
+
+    for line in lines[:30]:
+        assert array.intersects(line).tolist() == [other.intersect(line) for other in lines]
+
+    expected = {(i, j) for i in range(len(lines)) for j in range(i + 1, len(lines)) if lines[i].intersect(lines[j])}
+    assert set(zip(*array.intersecting_pairs(chunk_size=1000))) == expected
+
+    others = array[:20]
+    expected = {(i, j) for i in range(len(lines)) for j in range(20) if lines[i].intersect(lines[j])}
+    assert set(zip(*array.intersecting_pairs(others))) == expected
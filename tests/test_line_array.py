@@ -0,0 +1,40 @@
+import math
+
+from lazor.analysis import ideal_laser_distance, estimated_laser_time, join_lines
+from lazor.datastructures import Vec2, Line, LineArray
+
+
+LINES = [
+    Line(Vec2(0, 0), Vec2(3, 4)),
+    Line(Vec2(3, 4), Vec2(3, 10)),
+    Line(Vec2(6, 10), Vec2(-2, 10)),
+]
+
+
+def test_line_array_round_trip():
+    array = LineArray.from_lines(LINES)
+
+    assert array.coords.shape == (3, 2, 2)
+    assert len(array) == 3
+    assert array.to_lines() == LINES
+    assert array[1] == LINES[1]
+    assert array[1:].to_lines() == LINES[1:]
+
+
+def test_line_array_measurements():
+    array = LineArray.from_lines(LINES)
+
+    assert list(array.lengths()) == [5, 6, 8]
+    assert list(array.travel_lengths()) == [0, 3]
+
+    bounds = array.bounds()
+    assert bounds.min == Vec2(-2, 0)
+    assert bounds.max == Vec2(6, 10)
+
+
+def test_analysis_accepts_line_arrays():
+    array = LineArray.from_lines(LINES)
+
+    assert ideal_laser_distance(array) == ideal_laser_distance(LINES) == 22
+    assert math.isclose(estimated_laser_time(array, 1, 2), 3 + 19 / 2)
+    assert isinstance(join_lines(array), LineArray)
@@ -0,0 +1,96 @@
+import math
+
+import numpy as np
+
+from lazor.analysis import estimated_motion_time, estimated_laser_time, MotionProfile, fit_arcs
+from lazor.datastructures import Vec2, Line, LineArray
+
+
+def polyline(*points):
+    points = [Vec2(*point) for point in points]
+    return [Line(a, b) for a, b in zip(points, points[1:])]
+
+
+def reference_time(lines, profile):
+    """
+    A move at a time planner for straight lines, as a controller would run
+    it, to check the vectorised passes against.
+    """
+
+    moves = []
+    for n, line in enumerate(lines):
+        if n and lines[n - 1].end != line.start:
+            moves.append((Line(lines[n - 1].end, line.start), profile.idle_speed))
+        moves.append((line, profile.active_speed))
+    moves = [(line, speed) for line, speed in moves if line.length() > 0]
+
+    a = profile.acceleration
+    limits = [0.0]
+    for (first, first_speed), (second, second_speed) in zip(moves, moves[1:]):
+        cosine = -first.normalized().dot(second.normalized())
+        sine = math.sqrt(max(0.0, (1 - cosine) / 2))
+        junction = math.inf if sine > 1 - 1e-9 else a * profile.junction_deviation * sine / (1 - sine)
+        limits.append(min(junction, first_speed ** 2, second_speed ** 2))
+    limits.append(0.0)
+
+    for n, (line, _) in enumerate(moves):
+        limits[n + 1] = min(limits[n + 1], limits[n] + 2 * a * line.length())
+    for n in reversed(range(len(moves))):
+        limits[n] = min(limits[n], limits[n + 1] + 2 * a * moves[n][0].length())
+
+    time = 0
+    for n, (line, speed) in enumerate(moves):
+        entry, exit, length = math.sqrt(limits[n]), math.sqrt(limits[n + 1]), line.length()
+        peak = min(speed, math.sqrt((2 * a * length + entry ** 2 + exit ** 2) / 2))
+        cruising = length - (peak ** 2 - entry ** 2) / (2 * a) - (peak ** 2 - exit ** 2) / (2 * a)
+        time += (peak - entry) / a + (peak - exit) / a + max(cruising, 0) / peak
+    return time
+
+
+def test_single_moves():
+    profile = MotionProfile(active_speed=35, acceleration=500)
+
+    assert math.isclose(estimated_motion_time(polyline((0, 0), (100, 0)), profile), 100 / 35 + 35 / 500)
+    assert math.isclose(estimated_motion_time(polyline((0, 0), (1, 0)), profile), 2 * math.sqrt(1 / 500))
+    assert estimated_motion_time([], profile) == 0
+
+
+def test_straight_junctions_are_free_and_reversals_stop():
+    profile = MotionProfile()
+    straight = polyline(*[(x, 0) for x in range(0, 101, 10)])
+
+    assert math.isclose(estimated_motion_time(straight, profile), estimated_motion_time(polyline((0, 0), (100, 0)), profile))
+    assert math.isclose(estimated_motion_time(polyline((0, 0), (50, 0), (0, 0)), profile),
+                        2 * estimated_motion_time(polyline((0, 0), (50, 0)), profile))
+
+
+def test_matches_reference_planner():
+    rng = np.random.default_rng(0)
+    for profile in (MotionProfile(), MotionProfile(idle_speed=300, active_speed=20, acceleration=2000, junction_deviation=0.05)):
+        points = np.cumsum(rng.normal(size=(300, 2)), axis=0)
+        lines = polyline(*points.tolist())
+        lines += [Line(Vec2(*start), Vec2(*end)) for start, end in rng.uniform(0, 50, (100, 2, 2))]
+        lines.insert(50, Line(lines[49].end, lines[49].end))
+
+        assert math.isclose(estimated_motion_time(lines, profile), reference_time(lines, profile), rel_tol=1e-9)
+        assert math.isclose(estimated_motion_time(LineArray.from_lines(lines), profile), reference_time(lines, profile), rel_tol=1e-9)
+
+
+def test_approaches_constant_speed_estimate():
+    square = polyline((0, 0), (10, 0), (10, 10), (0, 10), (0, 0)) + polyline((20, 0), (30, 0))
+    profile = MotionProfile(acceleration=1e12)
+
+    assert estimated_motion_time(square) > estimated_laser_time(square, 100, 35)
+    assert math.isclose(estimated_motion_time(square, profile), estimated_laser_time(square, 100, 35), rel_tol=1e-6)
+
+
+def test_arcs_keep_speed_round_curves():
+    points = [(10 * math.cos(n * math.pi / 24), 10 * math.sin(n * math.pi / 24)) for n in range(49)]
+    lines = polyline(*points)
+    arcs = fit_arcs(lines, 0.05)
+
+    assert len(arcs) == 2
+    assert math.isclose(estimated_motion_time(arcs), 20 * math.pi / 35 + 35 / 500)
+
+    tight = MotionProfile(acceleration=50)
+    assert math.isclose(estimated_motion_time(arcs, tight), 20 * math.pi / math.sqrt(50 * 10) + math.sqrt(50 * 10) / 50)
@@ -0,0 +1,141 @@
+import random
+
+from lazor.analysis import optimise_line_set_ordering, ideal_laser_distance, \
+    chain_lines, order_chains, optimise_chain_ordering, laser_transitions, \
+    merge_colinear
+from lazor.datastructures import Vec2, Line, LineArray, KDTree
+
+
+def random_lines(seed, count, grid=None):
+    rng = random.Random(seed)
+
+    def coordinate():
+        if grid:
+            return rng.randrange(grid)
+        return rng.uniform(-100, 100)
+
+    return [Line(Vec2(coordinate(), coordinate()), Vec2(coordinate(), coordinate())) for _ in range(count)]
+
+
+def brute_force_ordering(lines):
+    remaining = list(lines)
+    current = LineArray.from_lines(lines).bounds().min
+    ordered = []
+
+    while remaining:
+        best = None
+        for n, line in enumerate(remaining):
+            for distance, flip in ((current.distance(line.end), True), (current.distance(line.start), False)):
+                if best is None or distance < best[0]:
+                    best = (distance, n, flip)
+
+        _, n, flip = best
+        line = remaining.pop(n)
+        if flip:
+            line = Line(line.end, line.start)
+        ordered.append(line)
+        current = line.end
+
+    return ordered
+
+
+def test_kd_tree_nearest_with_removals():
+    rng = random.Random(3)
+    points = [(rng.randrange(20), rng.randrange(20)) for _ in range(500)]
+    tree = KDTree(points)
+    alive = set(range(len(points)))
+
+    for _ in range(450):
+        x, y = rng.uniform(-5, 25), rng.uniform(-5, 25)
+        expected = min(alive, key=lambda n: ((points[n][0] - x) ** 2 + (points[n][1] - y) ** 2, n))
+        assert tree.nearest(x, y) == expected
+
+        tree.remove(expected)
+        alive.remove(expected)
+
+    assert len(tree) == 50
+
+
+def test_ordering_matches_brute_force_greedy():
+    for seed, grid in ((0, None), (1, None), (2, 10), (3, 4)):
+        lines = random_lines(seed, 200, grid)
+
+        ordered = optimise_line_set_ordering(lines)
+        expected = brute_force_ordering(lines)
+
+        assert [(line.start, line.end) for line in ordered] == [(line.start, line.end) for line in expected]
+
+
+def test_ordering_preserves_line_arrays():
+    lines = random_lines(4, 100)
+
+    ordered = optimise_line_set_ordering(LineArray.from_lines(lines))
+
+    assert isinstance(ordered, LineArray)
+    assert ordered.to_lines() == optimise_line_set_ordering(lines)
+    assert ideal_laser_distance(ordered) < ideal_laser_distance(lines)
+
+
+def polygon(*points):
+    points = [Vec2(*point) for point in points]
+    return [Line(points[n], points[(n + 1) % len(points)]) for n in range(len(points))]
+
+
+def test_chain_lines_follows_connected_lines():
+    square = polygon((0, 0), (1, 0), (1, 1), (0, 1))
+    path = [Line(Vec2(5, 0), Vec2(6, 0)), Line(Vec2(7, 0), Vec2(6, 0))]
+    rng = random.Random(5)
+    lines = square + path
+    rng.shuffle(lines)
+
+    chains = chain_lines(lines)
+
+    assert sorted(len(chain) for chain in chains) == [2, 4]
+    for chain in chains:
+        for a, b in zip(chain, chain[1:]):
+            assert a.end == b.start
+
+
+def test_chain_ordering_cuts_each_contour_in_one_pass():
+    squares = [polygon((x, 0), (x + 1, 0), (x + 1, 1), (x, 1)) for x in range(0, 20, 2)]
+    lines = [line for n in range(4) for square in squares for line in square[n:n + 1]]
+
+    ordered = optimise_chain_ordering(lines)
+
+    assert set(ordered) == set(lines)
+    assert laser_transitions(lines) == 40
+    assert laser_transitions(ordered) == 10
+
+
+def test_chain_ordering_enters_loops_at_the_nearest_vertex():
+    square = polygon((0, 0), (1, 0), (1, 1), (0, 1))
+    triangle = polygon((3, 3), (5, 3), (2, 1))
+
+    ordered = order_chains(chain_lines(square + triangle))
+
+    assert ordered[0][0].start == Vec2(0, 0)
+    assert ordered[1][0].start == Vec2(2, 1)
+
+
+def test_chains_stop_at_junctions():
+    cross = [Line(Vec2(0, 0), Vec2(1, 0)), Line(Vec2(1, 0), Vec2(2, 0)), Line(Vec2(1, 1), Vec2(1, 0)), Line(Vec2(1, -1), Vec2(1, 0))]
+    square = polygon((5, 0), (6, 0), (6, 1), (5, 1))
+
+    chains = chain_lines(cross + square, stop_at_junctions=True)
+
+    assert sorted(len(chain) for chain in chains) == [1, 1, 1, 1, 4]
+
+
+def test_merge_colinear_keeps_corners_and_junctions():
+    square = polygon((0, 0), (1, 0), (2, 0), (2, 1), (2, 2), (1, 2), (0, 2), (0, 1))
+    square = square[3:] + square[:3]
+    tee = [Line(Vec2(5, 0), Vec2(6, 0)), Line(Vec2(6, 0), Vec2(7, 0)), Line(Vec2(6, 0), Vec2(6, 1)), Line(Vec2(6, 1), Vec2(6, 2))]
+    bend = [Line(Vec2(10, 0), Vec2(11, 0)), Line(Vec2(11, 0), Vec2(12, 0.0001)), Line(Vec2(12, 0.0001), Vec2(13, 0.1))]
+
+    merged = merge_colinear(square + tee + bend)
+
+    assert set(merged) == set(polygon((0, 0), (2, 0), (2, 2), (0, 2))) | set(tee[:2]) | {
+        Line(Vec2(6, 0), Vec2(6, 2)), Line(Vec2(10, 0), Vec2(12, 0.0001)), bend[2]
+    }
+    assert len(merged) == 9
+    assert isinstance(merge_colinear(LineArray.from_lines(square)), LineArray)
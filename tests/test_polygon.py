@@ -1,6 +1,20 @@
+import math
+import random
+
+import numpy as np
+
 from lazor.datastructures import Vec2, Polygon
 
 
+def reference_inside(polygon, point):
+    inside = False
+    for start, end in polygon.lines:
+        if (start.y > point.y) != (end.y > point.y):
+            if start.x + (point.y - start.y) * (end.x - start.x) / (end.y - start.y) < point.x:
+                inside = not inside
+    return inside
+
+
 def test_point_outside_polygon():
     square = Polygon([Vec2(0, 0), Vec2(0, 1), Vec2(1, 1), Vec2(1, 0)])
     assert not square.inside(Vec2(0.5, 1.5))
@@ -16,4 +30,34 @@ def test_point_in_polygon_with_a_hole():
     assert not square.inside(Vec2(0.5, 0.5))
 
 
-
+def test_rays_along_edges_and_through_vertices():
+    u = Polygon([Vec2(*point) for point in [(0, 0), (3, 0), (3, 3), (2, 3), (2, 1), (1, 1), (1, 3), (0, 3)]])
+    notch = Polygon([Vec2(*point) for point in [(0, 0), (4, 0), (4, 4), (2, 2), (0, 4)]])
+
+    for polygon, point, expected in [
+        (u, (2.5, 1), True),
+        (u, (1.5, 1), False),
+        (u, (1.5, 2), False),
+        (u, (0.5, 3 - 1e-9), True),
+        (notch, (3, 2), True),
+        (notch, (1, 2), True),
+        (notch, (2, 3), False),
+    ]:
+        assert polygon.inside(Vec2(*point)) == expected
+        assert polygon.inside_many([point]).tolist() == [expected]
+
+
+def test_inside_many_matches_inside():
+    rng = random.Random(0)
+    outer = [Vec2(math.cos(n * math.pi / 20) * r, math.sin(n * math.pi / 20) * r)
+             for n, r in enumerate(rng.uniform(5, 10) for _ in range(40))]
+    hole = [Vec2(0.5 + math.cos(-n * math.pi / 4) * 2, 0.25 + math.sin(-n * math.pi / 4) * 2) for n in range(8)]
+    polygon = Polygon(outer, hole)
+    points = [Vec2(rng.uniform(-12, 12), rng.uniform(-12, 12)) for _ in range(500)]
+
+    expected = [reference_inside(polygon, point) for point in points]
+
+    assert polygon.inside_many(points).tolist() == expected
+    assert [polygon.inside(point) for point in points] == expected
+    assert polygon.inside_many(np.array([tuple(point) for point in points]), chunk_size=100).tolist() == expected
+    assert 0 < sum(expected) < len(points)
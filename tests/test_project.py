@@ -0,0 +1,44 @@
+import numpy as np
+import pytest
+
+from lazor.datastructures import LineArray
+from lazor.project import save, load, ProjectError
+
+
+def test_project_round_trip(tmp_path):
+    rng = np.random.default_rng(0)
+    layers = {"Cut": LineArray(rng.uniform(-100, 100, (1000, 2, 2))), "Ünicode": LineArray(rng.uniform(size=(3, 2, 2))), "Empty": []}
+    colours = {"Cut": 1, "Ünicode": 30, "Empty": 7}
+    filename = str(tmp_path / "job.lzr")
+
+    save(filename, layers, colours)
+    loaded, loaded_colours = load(filename)
+
+    assert list(loaded) == ["Cut", "Ünicode", "Empty"]
+    assert loaded_colours == colours
+    for name, lines in loaded.items():
+        assert np.array_equal(lines.coords, LineArray.from_lines(layers[name]).coords)
+
+    save(filename, loaded, loaded_colours)
+    assert np.array_equal(load(filename)[0]["Cut"].coords, layers["Cut"].coords)
+
+
+def test_load_rejects_other_files(tmp_path):
+    filename = tmp_path / "job.dxf"
+    filename.write_bytes(b"  0\nSECTION\n  2\nHEADER\n")
+
+    with pytest.raises(ProjectError):
+        load(str(filename))
+
+
+def test_load_rejects_empty_and_truncated_files(tmp_path):
+    filename = str(tmp_path / "job.lzr")
+    save(filename, {"Cut": LineArray(np.ones((10, 2, 2)))}, {"Cut": 1})
+    with open(filename, "rb") as f:
+        data = f.read()
+
+    for size in (0, 10, 30, len(data) - 8):
+        with open(filename, "wb") as f:
+            f.write(data[:size])
+        with pytest.raises(ProjectError):
+            load(filename)
@@ -0,0 +1,40 @@
+import math
+import random
+
+import numpy as np
+
+from lazor.analysis import douglas_peucker, simplify_lines
+from lazor.datastructures import Vec2, Line, LineArray
+
+
+def distance_to_segment(point, start, end):
+    line = end - start
+    along = min(max((point - start).dot(line) / line.dot(line), 0), 1)
+    return np.hypot(*(point - start - along * line))
+
+
+def test_douglas_peucker_bounds_deviation():
+    rng = np.random.default_rng(0)
+    points = np.cumsum(rng.normal(size=(2000, 2)), axis=0)
+
+    for tolerance in (0.1, 1, 5):
+        kept = douglas_peucker(points, tolerance)
+
+        assert kept[0] == 0 and kept[-1] == len(points) - 1
+        for first, last in zip(kept, kept[1:]):
+            for point in points[first:last + 1]:
+                assert distance_to_segment(point, points[first], points[last]) <= tolerance
+
+
+def test_simplify_lines_keeps_shapes_and_junctions():
+    circle = [Vec2(math.cos(n * math.pi / 500) * 10, math.sin(n * math.pi / 500) * 10) for n in range(1000)]
+    lines = [Line(circle[n], circle[(n + 1) % len(circle)]) for n in range(len(circle))]
+    tee = [Line(Vec2(20, 0), Vec2(21, 0)), Line(Vec2(21, 0), Vec2(22, 0)), Line(Vec2(21, 0), Vec2(21, 1))]
+    random.Random(0).shuffle(lines)
+
+    simplified = simplify_lines(LineArray.from_lines(lines + tee), 0.01)
+
+    assert isinstance(simplified, LineArray)
+    assert set(tee) <= set(simplified)
+    assert 70 <= len(simplified) - len(tee) < 200
+    assert {vert for line in simplified for vert in line} <= set(circle) | {vert for line in tee for vert in line}
@@ -0,0 +1,115 @@
+import math
+import random
+import time
+
+import numpy as np
+
+from lazor.analysis import optimise_line_set_ordering, ideal_laser_distance, estimated_motion_time
+from lazor.datastructures import Vec2, Line, LineArray
+from lazor.tour import Tour, improve_ordering, optimise_layers, budget_shares, MotionTime
+
+
+def random_tour(rng, size):
+    starts = [(rng.random(), rng.random()) for _ in range(size)]
+    ends = [(rng.random(), rng.random()) for _ in range(size)]
+    return Tour(starts, ends, range(size), [rng.random() < 0.5 for _ in range(size)])
+
+
+def test_move_deltas_match_recalculated_cost():
+    rng = random.Random(0)
+
+    for _ in range(100):
+        tour = random_tour(rng, rng.randint(4, 12))
+
+        for _ in range(10):
+            before = tour.cost()
+            if rng.random() < 0.5:
+                first = rng.randrange(tour.size)
+                last = rng.randrange(first, tour.size)
+                delta = tour.reversal_delta(first, last)
+                tour.reverse(first, last)
+            else:
+                first = rng.randrange(tour.size - 2)
+                last = first + rng.randint(0, 1)
+                after = rng.choice([p for p in range(-1, tour.size) if not first - 1 <= p <= last])
+                reverse = rng.random() < 0.5
+                delta = tour.move_delta(first, last, after, reverse)
+                tour.move(first, last, after, reverse)
+
+            assert math.isclose(tour.cost(), before + delta, abs_tol=1e-9)
+            assert sorted(tour.order) == list(range(tour.size))
+            assert all(tour.position[item] == p for p, item in enumerate(tour.order))
+
+
+def test_improve_ordering_shortens_travel():
+    rng = random.Random(1)
+    lines = []
+    for _ in range(300):
+        x, y = rng.uniform(0, 100), rng.uniform(0, 100)
+        lines.append(Line(Vec2(x, y), Vec2(x + rng.uniform(-2, 2), y + rng.uniform(-2, 2))))
+
+    greedy = optimise_line_set_ordering(lines)
+    improved = improve_ordering(greedy, time_budget=1, workers=1)
+
+    assert ideal_laser_distance(improved) < ideal_laser_distance(greedy)
+    assert set(improved) == set(lines)
+
+
+def test_improve_ordering_keeps_line_arrays():
+    lines = LineArray([[[0, 0], [1, 0]], [[5, 0], [6, 0]], [[1, 0], [2, 0]], [[6, 0], [7, 0]]])
+
+    improved = improve_ordering(lines, time_budget=0.5, workers=1)
+
+    assert isinstance(improved, LineArray)
+    assert ideal_laser_distance(improved) == 7
+
+
+def long_lines(seed, count):
+    rng = np.random.default_rng(seed)
+    starts = rng.uniform(0, 500, (count, 2))
+    angles = rng.uniform(0, 2 * np.pi, count)
+    ends = starts + np.column_stack([np.cos(angles), np.sin(angles)]) * rng.uniform(20, 40, (count, 1))
+    return LineArray(np.stack([starts, ends], axis=1))
+
+
+def test_motion_cost_matches_motion_model():
+    lines = long_lines(0, 100)
+    lines = LineArray(np.concatenate([lines.coords, [[lines.ends[-1], lines.ends[-1] + (30, 0)]]]))
+    cost = MotionTime()
+    start_tangents, end_tangents = lines.tangents()
+    starts, ends = cost.ports(lines.starts, -start_tangents), cost.ports(lines.ends, end_tangents)
+    tour = Tour(starts, ends, range(len(lines)), [False] * len(lines), cost.link)
+
+    cutting = lines.lengths().sum() / cost.profile.active_speed + 2 * cost.slowdown(0)
+    assert math.isclose(tour.cost() + cutting, estimated_motion_time(lines), rel_tol=1e-9)
+
+    for exit, entry in zip(starts + ends, ends[::-1] + starts[::-1]):
+        assert math.isclose(cost.link(exit, entry), cost.link(entry, exit))
+
+
+def test_improve_ordering_for_motion_time():
+    greedy = optimise_line_set_ordering(long_lines(1, 150))
+
+    improved = improve_ordering(greedy, time_budget=1, workers=1, cost=MotionTime())
+
+    assert estimated_motion_time(improved) < estimated_motion_time(greedy)
+    assert set(improved) == set(greedy)
+
+
+def test_budget_shares_split_time_by_size():
+    shares = list(budget_shares([1, 3, 0, 4], 8))
+
+    # Each job here finishes instantly, leaving its share to the rest.
+    assert [round(share, 2) for share in shares] == [1, round(8 * 3 / 7, 2), 0, 8]
+    assert list(budget_shares([0, 0], 8)) == [0, 0]
+
+
+def test_optimise_layers_shares_one_budget():
+    layers = {name: list(long_lines(seed, 40)) for seed, name in enumerate("abcdefgh")}
+    before = {name: ideal_laser_distance(layer) for name, layer in layers.items()}
+
+    started = time.time()
+    optimise_layers(layers, list(layers), time_budget=0.8, workers=1)
+
+    assert time.time() - started < 2
+    assert all(ideal_laser_distance(layers[name]) < before[name] for name in layers)